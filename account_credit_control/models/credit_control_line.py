@@ -213,12 +213,13 @@ class CreditControlLine(models.Model):
         tolerance = {}
         tolerance_base = company.credit_control_tolerance
         user_currency = company.currency_id
+        # Resolve all the rates at once instead of one query by currency
+        rates = (currencies | user_currency)._get_rates(
+            company, controlling_date or fields.Date.today()
+        )
         for currency in currencies:
-            tolerance[currency.id] = currency._convert(
-                tolerance_base,
-                user_currency,
-                company,
-                controlling_date or fields.Date.today(),
+            tolerance[currency.id] = user_currency.round(
+                tolerance_base * rates[user_currency.id] / rates[currency.id]
             )
 
         lines_to_create = []
@@ -4,7 +4,7 @@
 {
     "name": "Account Financial Risk",
     "summary": "Manage customer risk",
-    "version": "14.0.2.2.1",
+    "version": "14.0.2.15.0",
     "category": "Accounting",
     "license": "AGPL-3",
     "author": "Tecnativa, Odoo Community Association (OCA)",
@@ -14,11 +14,17 @@
     "data": [
         "security/security.xml",
         "security/ir.model.access.csv",
+        "data/ir_cron.xml",
         "views/account_financial_risk_view.xml",
+        "views/partner_risk_ledger_views.xml",
+        "views/partner_risk_recompute_job_views.xml",
+        "views/partner_risk_snapshot_views.xml",
         "views/res_config_view.xml",
         "views/res_partner_view.xml",
         "wizards/partner_risk_exceeded_view.xml",
         "templates/assets.xml",
     ],
     "installable": True,
+    "pre_init_hook": "pre_init_hook",
+    "post_init_hook": "post_init_hook",
 }
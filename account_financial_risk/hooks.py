@@ -0,0 +1,77 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import logging
+
+from odoo import SUPERUSER_ID, api
+from odoo.tools import sql
+
+logger = logging.getLogger(__name__)
+
+
+def pre_init_hook(cr):
+    """Speed up the installation of the module on an existing database"""
+    create_risk_amount_total_currency_column(cr)
+
+
+def post_init_hook(cr, registry):
+    """Fill the partner risk ledger and the partners hierarchy closure when
+    the module is installed on a database with existing data.
+    """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    compute_missing_risk_amount_total_currency(env)
+    env["partner.risk.closure"]._rebuild()
+    env["partner.risk.ledger"]._rebuild()
+
+
+def create_risk_amount_total_currency_column(cr):
+    """Create the column of account.move risk_amount_total_currency and fill
+    it with SQL for the moves whose partner risk currency is the company
+    currency, that is to say, most of them.
+    """
+    if not sql.column_exists(cr, "account_move", "risk_amount_total_currency"):
+        sql.create_column(cr, "account_move", "risk_amount_total_currency", "numeric")
+    logger.info("Computing field risk_amount_total_currency on account.move")
+    credit_currency_clause = ""
+    if sql.column_exists(cr, "res_partner", "credit_currency"):
+        credit_currency_clause = (
+            "AND COALESCE(rp.credit_currency, 'company') = 'company'"
+        )
+    # Partners without company use the currency of the company of the move
+    cr.execute(
+        """
+        UPDATE account_move am
+        SET risk_amount_total_currency = am.amount_total_signed
+        FROM res_company rc
+        WHERE rc.id = am.company_id
+            AND am.risk_amount_total_currency IS NULL
+            AND (
+                am.partner_id IS NULL
+                OR EXISTS (
+                    SELECT 1
+                    FROM res_partner rp
+                    LEFT JOIN res_company prc ON prc.id = rp.company_id
+                    WHERE rp.id = COALESCE(am.commercial_partner_id, am.partner_id)
+                        AND COALESCE(prc.currency_id, rc.currency_id) = rc.currency_id
+                        {}
+                )
+            )
+        """.format(
+            credit_currency_clause
+        )
+    )
+
+
+def compute_missing_risk_amount_total_currency(env):
+    """Compute with the ORM the moves not filled with SQL"""
+    env.cr.execute(
+        "SELECT id FROM account_move WHERE risk_amount_total_currency IS NULL"
+    )
+    moves = env["account.move"].browse([row[0] for row in env.cr.fetchall()])
+    if not moves:
+        return
+    logger.info(
+        "Computing field risk_amount_total_currency on %s account.move", len(moves)
+    )
+    env.add_to_compute(moves._fields["risk_amount_total_currency"], moves)
+    moves.flush(["risk_amount_total_currency"])
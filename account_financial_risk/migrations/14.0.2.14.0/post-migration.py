@@ -0,0 +1,13 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from openupgradelib import openupgrade
+
+from odoo.addons.account_financial_risk.hooks import (
+    compute_missing_risk_amount_total_currency,
+)
+
+
+@openupgrade.migrate()
+def migrate(env, version):
+    compute_missing_risk_amount_total_currency(env)
@@ -1,4 +1,12 @@
 from . import account_invoice
+from . import account_move_line
+from . import partner_risk_closure
+from . import partner_risk_ledger
+from . import partner_risk_ledger_queue
+from . import partner_risk_recompute_job
+from . import partner_risk_reservation
+from . import partner_risk_snapshot
 from . import res_company
 from . import res_config
+from . import res_currency
 from . import res_partner
@@ -1,6 +1,8 @@
 # Copyright 2016-2018 Tecnativa - Carlos Dauden
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
+from collections import defaultdict
+
 from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
 
@@ -8,76 +10,121 @@ from odoo.exceptions import ValidationError
 class AccountMove(models.Model):
     _inherit = "account.move"
 
-    risk_currency_id = fields.Many2one(related="partner_id.risk_currency_id")
+    risk_currency_id = fields.Many2one(
+        comodel_name="res.currency",
+        string="Risk Currency",
+        compute="_compute_risk_currency_id",
+    )
     risk_amount_total_currency = fields.Monetary(
         string="Risk Amount Total",
         currency_field="risk_currency_id",
         compute="_compute_risk_amount_total_currency",
+        store=True,
     )
 
+    @api.depends("partner_id.commercial_partner_id.risk_currency_id", "company_id")
+    def _compute_risk_currency_id(self):
+        """Risk currency of the commercial partner in the company of the move,
+        whoever reads it.
+        """
+        for move in self:
+            move.risk_currency_id = move.partner_id.commercial_partner_id.with_company(
+                move.company_id
+            ).risk_currency_id
+
     @api.depends(
-        "line_ids.debit",
-        "line_ids.credit",
-        "line_ids.currency_id",
-        "line_ids.amount_currency",
-        "line_ids.amount_residual",
-        "line_ids.amount_residual_currency",
-        "line_ids.payment_id.state",
-        "partner_id.credit_currency",
-        "partner_id.manual_credit_currency_id",
-        "partner_id.property_account_receivable_id.currency_id",
-        "partner_id.country_id",
-        "company_currency_id",
+        "amount_total_signed",
+        "company_id.currency_id",
+        "risk_currency_id",
+        "invoice_date",
+        "date",
     )
     def _compute_risk_amount_total_currency(self):
+        """Convert the invoices grouped by currency, company and date, so
+        every rate is resolved once for the whole batch.
+        """
+        groups = defaultdict(list)
         for invoice in self:
-            invoice.risk_amount_total_currency = invoice.company_currency_id._convert(
-                invoice.amount_total_signed,
+            key = (
                 invoice.risk_currency_id,
                 invoice.company_id,
-                invoice.invoice_date or fields.Date.context_today(self),
-                round=False,
+                invoice.invoice_date or invoice.date,
             )
+            groups[key].append(invoice)
+        self.env["res.currency"]._preload_risk_rates(
+            (company.currency_id, risk_currency, company, date)
+            for risk_currency, company, date in groups
+        )
+        for (risk_currency, company, date), invoices in groups.items():
+            rate = company.currency_id._risk_convert(1.0, risk_currency, company, date)
+            for invoice in invoices:
+                invoice.risk_amount_total_currency = invoice.amount_total_signed * rate
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "state" in vals:
+            self.mapped("line_ids")._mark_risk_ledger_dirty()
+        return res
 
     def risk_exception_msg(self):
         self.ensure_one()
         partner = self.partner_id.commercial_partner_id
-        exception_msg = ""
-        if partner.risk_exception:
-            exception_msg = _("Financial risk exceeded.\n")
-        elif partner.risk_invoice_open_limit and (
-            (partner.risk_invoice_open + self.risk_amount_total_currency)
-            > partner.risk_invoice_open_limit
-        ):
-            exception_msg = _("This invoice exceeds the open invoices risk.\n")
-        # If risk_invoice_draft_include this invoice included in risk_total
-        elif not partner.risk_invoice_draft_include and (
-            partner.risk_invoice_open_include
-            and (partner.risk_total + self.risk_amount_total_currency)
-            > partner.credit_limit
-        ):
-            exception_msg = _("This invoice exceeds the financial risk.\n")
-        return exception_msg
+        return partner._get_invoice_risk_exception_msg(self.risk_amount_total_currency)
 
-    def _first_invoice_exception_msg(self):
-        """
-        Method used to return the first invoice with exception message.
+    def _get_risk_exception_invoices(self):
+        """Evaluate all the invoices to post at once, in posting order.
+
+        The risk of every partner is read once and the amounts of the
+        accepted invoices are accumulated by partner, so the invoices of the
+        same partner are checked against each other. Accepted invoices
+        reserve their amount.
+
+        :return: list of tuples (invoice, exception message) of the blocked
+                 invoices
         """
-        ret = False, False
         if self.env.context.get("bypass_risk", False):
-            return ret
-        for invoice in self.filtered(
+            return []
+        invoices = self.filtered(
             lambda x: x.move_type == "out_invoice"
             and not x.company_id.allow_overrisk_invoice_validation
-        ):
-            exception_msg = invoice.risk_exception_msg()
-            if exception_msg:
-                ret = invoice, exception_msg
-                break
-        return ret
+        )
+        if not invoices:
+            return []
+        # Invoices being posted at the same time by other transactions are
+        # checked too, and the accepted invoices reserve their amount
+        exception_msgs = self.env["partner.risk.reservation"]._simulate_and_reserve(
+            invoices,
+            [
+                {
+                    "type": "invoice",
+                    "partner_id": invoice.partner_id.commercial_partner_id.id,
+                    # In the risk currency of the commercial partner
+                    "amount": invoice.risk_amount_total_currency,
+                    "currency_id": invoice.risk_currency_id.id,
+                    "date": invoice.invoice_date,
+                }
+                for invoice in invoices
+            ],
+        )
+        return [
+            (invoice, exception_msg)
+            for invoice, exception_msg in zip(invoices, exception_msgs)
+            if exception_msg
+        ]
+
+    def _first_invoice_exception_msg(self):
+        """
+        Method used to return the first invoice with exception message.
+        """
+        blocked = self._get_risk_exception_invoices()
+        return blocked[0] if blocked else (False, False)
 
     def _post(self, soft=True):
-        invoice, exception_msg = self._first_invoice_exception_msg()
+        # Invoices checked by action_post already hold their reservation
+        if set(self.ids) <= set(self.env.context.get("risk_checked_move_ids", [])):
+            invoice, exception_msg = False, False
+        else:
+            invoice, exception_msg = self._first_invoice_exception_msg()
         if exception_msg and self.env.context.get("active_model", False):
             # Active model is "account.move" if we select moves from tree view and
             # we use validate.account.move wizard.
@@ -87,6 +134,7 @@ class AccountMove(models.Model):
             # Therefore the only way to show the notice is with raise and to be able
             # to validate invoices with exceeded risk it must be done from the
             # form view
+            self.env["partner.risk.reservation"]._release(self)
             raise ValidationError(
                 _(
                     "The partner %s is in risk exception.\n"
@@ -94,13 +142,30 @@ class AccountMove(models.Model):
                 )
                 % invoice.partner_id.commercial_partner_id.display_name
             )
-        return super()._post(soft)
+        res = super()._post(soft)
+        self.env["partner.risk.reservation"]._convert(
+            self.filtered(lambda x: x.state == "posted")
+        )
+        return res
+
+    def button_draft(self):
+        self.env["partner.risk.reservation"]._release(self)
+        return super().button_draft()
+
+    def button_cancel(self):
+        self.env["partner.risk.reservation"]._release(self)
+        return super().button_cancel()
+
+    def _filter_risk_reservation_settled(self):
+        """Documents already included in the partner risk"""
+        return self.filtered(lambda x: x.state == "posted")
 
     def action_post(self):
         invoice, exception_msg = self._first_invoice_exception_msg()
         if exception_msg and not self.env.context.get("active_model", False):
             # Active active_model is False if we click in form view header buttons
             # as 'Confirm'.
+            self.env["partner.risk.reservation"]._release(self)
             return (
                 self.env["partner.risk.exceeded.wiz"]
                 .create(
@@ -113,4 +178,7 @@ class AccountMove(models.Model):
                 )
                 .action_show()
             )
-        return super().action_post()
+        moves = self
+        if not exception_msg:
+            moves = self.with_context(risk_checked_move_ids=self.ids)
+        return super(AccountMove, moves).action_post()
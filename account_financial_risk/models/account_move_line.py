@@ -0,0 +1,92 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import api, models
+
+
+class AccountMoveLine(models.Model):
+    _inherit = "account.move.line"
+
+    def init(self):
+        super().init()
+        # Speed up the daily rollover of the partner risk ledger
+        self.env.cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS account_move_line_risk_maturity_index
+            ON account_move_line (company_id, COALESCE(date_maturity, date))
+            WHERE account_internal_type = 'receivable' AND reconciled IS NOT TRUE
+            """
+        )
+
+    @api.model
+    def _risk_ledger_fields(self):
+        """Fields that change the amounts of the partner risk ledger"""
+        return {
+            "partner_id",
+            "account_id",
+            "company_id",
+            "date",
+            "date_maturity",
+            "debit",
+            "credit",
+            "balance",
+            "amount_currency",
+            "move_id",
+        }
+
+    def _mark_risk_ledger_dirty(self):
+        lines = self.sudo().filtered(
+            lambda x: x.account_id.internal_type == "receivable"
+        )
+        self.env["partner.risk.ledger"]._mark_partners_dirty(
+            lines.mapped("partner_id").ids
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        lines._mark_risk_ledger_dirty()
+        return lines
+
+    @api.model
+    def _risk_ledger_key_fields(self):
+        """Fields that can move the line to another partner ledger"""
+        return {"partner_id", "account_id", "company_id", "move_id"}
+
+    def write(self, vals):
+        ledger_change = not self._risk_ledger_fields().isdisjoint(vals)
+        if ledger_change and not self._risk_ledger_key_fields().isdisjoint(vals):
+            # Previous partners are only affected if lines change of ledger
+            self._mark_risk_ledger_dirty()
+        res = super().write(vals)
+        if ledger_change:
+            self._mark_risk_ledger_dirty()
+        return res
+
+    def unlink(self):
+        self._mark_risk_ledger_dirty()
+        return super().unlink()
+
+
+class AccountPartialReconcile(models.Model):
+    _inherit = "account.partial.reconcile"
+
+    def _mark_risk_ledger_dirty(self):
+        lines = self.sudo().mapped("debit_move_id") | self.sudo().mapped(
+            "credit_move_id"
+        )
+        lines._mark_risk_ledger_dirty()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        partials = super().create(vals_list)
+        partials._mark_risk_ledger_dirty()
+        return partials
+
+    def write(self, vals):
+        self._mark_risk_ledger_dirty()
+        return super().write(vals)
+
+    def unlink(self):
+        self._mark_risk_ledger_dirty()
+        return super().unlink()
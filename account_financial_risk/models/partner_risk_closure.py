@@ -0,0 +1,185 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import api, fields, models
+
+
+class PartnerRiskClosure(models.Model):
+    """Ancestor/descendant pairs of the partner hierarchy.
+
+    Every partner is its own ancestor with depth 0, so the whole subtree of a
+    partner, or all the ancestors of a partner, are read with one indexed
+    query instead of traversing child_ids or parent_id.
+    """
+
+    _name = "partner.risk.closure"
+    _description = "Partner Hierarchy Closure"
+    _log_access = False
+
+    ancestor_id = fields.Many2one(
+        comodel_name="res.partner", required=True, index=True, ondelete="cascade"
+    )
+    descendant_id = fields.Many2one(
+        comodel_name="res.partner", required=True, index=True, ondelete="cascade"
+    )
+    depth = fields.Integer(required=True)
+
+    _sql_constraints = [
+        (
+            "ancestor_descendant_uniq",
+            "unique(ancestor_id, descendant_id)",
+            "Only one closure row by ancestor and descendant.",
+        )
+    ]
+
+    @api.model
+    def _rebuild(self):
+        """Fill the table from the parent_id of all the partners"""
+        self.env["res.partner"].flush(["parent_id"])
+        self.env.cr.execute("DELETE FROM partner_risk_closure")
+        self.env.cr.execute(
+            """
+            WITH RECURSIVE closure(ancestor_id, descendant_id, depth) AS (
+                SELECT id, id, 0
+                FROM res_partner
+                UNION ALL
+                SELECT partner.parent_id, closure.descendant_id, closure.depth + 1
+                FROM closure
+                JOIN res_partner partner ON partner.id = closure.ancestor_id
+                WHERE partner.parent_id IS NOT NULL
+            )
+            INSERT INTO partner_risk_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, descendant_id, depth
+            FROM closure
+            """
+        )
+        self.invalidate_cache(["ancestor_id", "descendant_id", "depth"])
+
+    @api.model
+    def _add_partners(self, partners):
+        """Insert the rows of new partners, that have no descendants yet.
+        Partners must be sorted so that parents come before their children.
+        """
+        if not partners:
+            return
+        self.env.cr.execute(
+            """
+            INSERT INTO partner_risk_closure (ancestor_id, descendant_id, depth)
+            SELECT id, id, 0
+            FROM res_partner
+            WHERE id IN %s
+            """,
+            (tuple(partners.ids),),
+        )
+        for partner in partners.filtered("parent_id"):
+            self.env.cr.execute(
+                """
+                INSERT INTO partner_risk_closure (ancestor_id, descendant_id, depth)
+                SELECT ancestor_id, %s, depth + 1
+                FROM partner_risk_closure
+                WHERE descendant_id = %s
+                """,
+                (partner.id, partner.parent_id.id),
+            )
+        self.invalidate_cache(["ancestor_id", "descendant_id", "depth"])
+
+    @api.model
+    def _move_partners(self, partners):
+        """Move the subtrees of the given partners below their current
+        parent_id.
+        """
+        for partner in partners:
+            # Detach the subtree from its previous ancestors
+            self.env.cr.execute(
+                """
+                DELETE FROM partner_risk_closure
+                WHERE descendant_id IN (
+                        SELECT descendant_id
+                        FROM partner_risk_closure
+                        WHERE ancestor_id = %(partner)s
+                    )
+                    AND ancestor_id IN (
+                        SELECT ancestor_id
+                        FROM partner_risk_closure
+                        WHERE descendant_id = %(partner)s
+                            AND ancestor_id != %(partner)s
+                    )
+                """,
+                {"partner": partner.id},
+            )
+            if not partner.parent_id:
+                continue
+            self.env.cr.execute(
+                """
+                INSERT INTO partner_risk_closure (ancestor_id, descendant_id, depth)
+                SELECT parent.ancestor_id, subtree.descendant_id,
+                    parent.depth + subtree.depth + 1
+                FROM partner_risk_closure parent, partner_risk_closure subtree
+                WHERE parent.descendant_id = %s AND subtree.ancestor_id = %s
+                """,
+                (partner.parent_id.id, partner.id),
+            )
+        self.invalidate_cache(["ancestor_id", "descendant_id", "depth"])
+
+    @api.model
+    def _rebuild_subtrees(self, partners):
+        """Replace the rows of the subtrees of the given partners by the ones
+        given by parent_id, for the hierarchies changed without the ORM.
+        """
+        if not partners:
+            return
+        self.env["res.partner"].flush(["parent_id"])
+        self.env.cr.execute(
+            """
+            WITH RECURSIVE subtree(id) AS (
+                SELECT id
+                FROM res_partner
+                WHERE id IN %s
+                UNION
+                SELECT partner.id
+                FROM res_partner partner
+                JOIN subtree ON partner.parent_id = subtree.id
+            )
+            SELECT id FROM subtree
+            """,
+            (tuple(partners.ids),),
+        )
+        subtree_ids = tuple(row[0] for row in self.env.cr.fetchall())
+        self.env.cr.execute(
+            "DELETE FROM partner_risk_closure WHERE descendant_id IN %s",
+            (subtree_ids,),
+        )
+        self.env.cr.execute(
+            """
+            WITH RECURSIVE closure(ancestor_id, descendant_id, depth) AS (
+                SELECT id, id, 0
+                FROM res_partner
+                WHERE id IN %s
+                UNION ALL
+                SELECT partner.parent_id, closure.descendant_id, closure.depth + 1
+                FROM closure
+                JOIN res_partner partner ON partner.id = closure.ancestor_id
+                WHERE partner.parent_id IS NOT NULL
+            )
+            INSERT INTO partner_risk_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, descendant_id, depth
+            FROM closure
+            """,
+            (subtree_ids,),
+        )
+        self.invalidate_cache(["ancestor_id", "descendant_id", "depth"])
+
+    @api.model
+    def _get_ancestor_ids(self, partner_ids):
+        """Ancestors of the given partners, including themselves"""
+        if not partner_ids:
+            return []
+        self.env.cr.execute(
+            """
+            SELECT DISTINCT ancestor_id
+            FROM partner_risk_closure
+            WHERE descendant_id IN %s
+            """,
+            (tuple(partner_ids),),
+        )
+        return [row[0] for row in self.env.cr.fetchall()]
@@ -0,0 +1,360 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import logging
+
+from odoo import api, fields, models
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+PENDING_KEY = "account_financial_risk.ledger_pending"
+DEFERRED_KEY = "account_financial_risk.ledger_deferred"
+
+
+class PartnerRiskLedger(models.Model):
+    """Stored residual amounts by partner, company, account and risk bucket.
+
+    Rows are refreshed only for the partners whose receivable lines change, so
+    reading the partner risk doesn't need to aggregate account.move.line.
+    """
+
+    _name = "partner.risk.ledger"
+    _description = "Partner Risk Ledger"
+    _log_access = False
+    _rebuild_chunk_size = 1000
+
+    partner_id = fields.Many2one(
+        comodel_name="res.partner",
+        required=True,
+        index=True,
+        ondelete="cascade",
+    )
+    company_id = fields.Many2one(
+        comodel_name="res.company",
+        required=True,
+        index=True,
+        ondelete="cascade",
+    )
+    account_id = fields.Many2one(
+        comodel_name="account.account",
+        required=True,
+        ondelete="cascade",
+    )
+    bucket = fields.Char(
+        required=True,
+        help="Key of the group in res.partner._risk_account_groups",
+    )
+    currency_id = fields.Many2one(related="company_id.currency_id")
+    amount_residual = fields.Monetary(currency_field="currency_id")
+
+    _sql_constraints = [
+        (
+            "partner_company_account_bucket_uniq",
+            "unique(partner_id, company_id, account_id, bucket)",
+            "Only one ledger row by partner, company, account and bucket.",
+        )
+    ]
+
+    @api.model
+    def _mark_partners_dirty(self, partner_ids):
+        """Register partners whose ledger rows must be refreshed before the
+        next risk read or, at latest, before the transaction commits.
+
+        With the context key defer_risk_recompute, used for mass operations
+        as billing runs or bank statement reconciliations, partners are only
+        queued and refreshed by a follow-up job, so their risk isn't updated
+        within the transaction.
+        """
+        partner_ids = {pid for pid in partner_ids if pid}
+        if not partner_ids:
+            return
+        data = self.env.cr.precommit.data
+        if self.env.context.get("defer_risk_recompute"):
+            if DEFERRED_KEY not in data:
+                data[DEFERRED_KEY] = set()
+                self.env.cr.precommit.add(self._enqueue_deferred)
+            data[DEFERRED_KEY] |= partner_ids
+            return
+        if PENDING_KEY not in data:
+            data[PENDING_KEY] = set()
+            self.env.cr.precommit.add(self._process_pending)
+        data[PENDING_KEY] |= partner_ids
+        self._notify_partners_modified(partner_ids)
+
+    @api.model
+    def _notify_partners_modified(self, partner_ids):
+        """Invalidate the risk amounts of the given partners and mark the
+        stored risk state (risk_total, risk_exception...) to recompute.
+        """
+        partner_model = self.env["res.partner"]
+        risk_fnames = [x[0] for x in partner_model._risk_field_list()]
+        partner_model.invalidate_cache(fnames=risk_fnames, ids=list(partner_ids))
+        partners = partner_model.browse(partner_ids)
+        partners.modified(risk_fnames)
+        partners._invalidate_risk_group_ancestors()
+
+    @api.model
+    def _process_pending(self):
+        pending = self.env.cr.precommit.data.get(PENDING_KEY)
+        if not pending:
+            return
+        partner_ids = set(pending)
+        pending.clear()
+        self._refresh_partners(partner_ids)
+
+    @api.model
+    def _enqueue_deferred(self):
+        deferred = self.env.cr.precommit.data.get(DEFERRED_KEY)
+        if not deferred:
+            return
+        partner_ids = set(deferred)
+        deferred.clear()
+        self.env["partner.risk.ledger.queue"]._enqueue(partner_ids)
+
+    @api.model
+    def _get_ledger_companies(self):
+        return self.env["res.company"].sudo().search([])
+
+    @api.model
+    def _get_ledger_groups(self, companies):
+        """Risk account groups of every company, as each company has its own
+        maturity margin.
+
+        :return: dict {company: groups}
+        """
+        return {
+            company: self.env["res.partner"]
+            .sudo()
+            .with_context(allowed_company_ids=company.ids)
+            ._risk_account_groups()
+            for company in companies
+        }
+
+    @api.model
+    def _get_bucket_where_clauses(self, company_groups):
+        """Translate the domains of the risk account groups into SQL filters
+        over account_move_line.
+
+        :return: dict {bucket: (where_clause, params)} or None if any domain
+                 needs a join, so it can't be used as a filter of a single
+                 table scan.
+        """
+        AccountMoveLine = self.env["account.move.line"].sudo()
+        clauses = {}
+        for groups in company_groups.values():
+            for key, group in groups.items():
+                AccountMoveLine._flush_search(group["domain"])
+                query = AccountMoveLine._where_calc(group["domain"])
+                from_clause, where_clause, params = query.get_sql()
+                if from_clause != '"account_move_line"':
+                    return None
+                clauses.setdefault(key, []).append((where_clause or "TRUE", params))
+        return {
+            key: (
+                " OR ".join("(%s)" % clause for clause, _params in bucket_clauses),
+                [param for _clause, params in bucket_clauses for param in params],
+            )
+            for key, bucket_clauses in clauses.items()
+        }
+
+    @api.model
+    def _compute_ledger_rows(self, partner_ids, companies):
+        """Aggregate receivable residuals of the given partners for every
+        group defined in res.partner._risk_account_groups.
+
+        All the groups are classified with conditional aggregation in one scan
+        of the partner lines.
+
+        :return: list of tuples (partner_id, company_id, account_id, bucket,
+                 amount_residual)
+        """
+        company_groups = self._get_ledger_groups(companies)
+        bucket_clauses = self._get_bucket_where_clauses(company_groups)
+        if bucket_clauses is None:
+            return self._compute_ledger_rows_read_group(partner_ids, company_groups)
+        self.env["account.move.line"].flush(
+            ["partner_id", "company_id", "account_id", "amount_residual"]
+        )
+        buckets = list(bucket_clauses.keys())
+        select_columns = []
+        select_params = []
+        for key in buckets:
+            clause, params = bucket_clauses[key]
+            select_columns.append(
+                "SUM(amount_residual) FILTER (WHERE {0}), "
+                "COUNT(*) FILTER (WHERE {0})".format(clause)
+            )
+            select_params += params * 2
+        where_params = [param for key in buckets for param in bucket_clauses[key][1]]
+        self.env.cr.execute(
+            """
+            SELECT partner_id, company_id, account_id, {}
+            FROM account_move_line
+            WHERE partner_id IN %s AND ({})
+            GROUP BY partner_id, company_id, account_id
+            """.format(
+                ", ".join(select_columns),
+                " OR ".join("(%s)" % bucket_clauses[key][0] for key in buckets),
+            ),
+            select_params + [tuple(partner_ids)] + where_params,
+        )
+        rows = []
+        for res in self.env.cr.fetchall():
+            for index, key in enumerate(buckets):
+                amount, count = res[3 + index * 2 : 5 + index * 2]
+                if count:
+                    rows.append((res[0], res[1], res[2], key, amount))
+        return rows
+
+    @api.model
+    def _compute_ledger_rows_read_group(self, partner_ids, company_groups):
+        """Fallback with a read_group by company and group for domains that
+        can't be evaluated as filters of a single scan.
+        """
+        AccountMoveLine = self.env["account.move.line"].sudo()
+        rows = []
+        for company, groups in company_groups.items():
+            for key, group in groups.items():
+                read_group = AccountMoveLine.read_group(
+                    group["domain"] + [("partner_id", "in", list(partner_ids))],
+                    ["partner_id", "account_id", "amount_residual"],
+                    ["partner_id", "account_id"],
+                    orderby="id",
+                    lazy=False,
+                )
+                for reg in read_group:
+                    rows.append(
+                        (
+                            reg["partner_id"][0],
+                            company.id,
+                            reg["account_id"][0],
+                            key,
+                            reg["amount_residual"],
+                        )
+                    )
+        return rows
+
+    @api.model
+    def _refresh_partners(self, partner_ids, companies=None):
+        """Replace the ledger rows of the given partners"""
+        partner_ids = list(partner_ids)
+        if not partner_ids:
+            return
+        companies = companies or self._get_ledger_companies()
+        rows = self._compute_ledger_rows(partner_ids, companies)
+        self.env.cr.execute(
+            """
+            DELETE FROM partner_risk_ledger
+            WHERE partner_id IN %s AND company_id IN %s
+            """,
+            (tuple(partner_ids), tuple(companies.ids)),
+        )
+        self._insert_rows(rows)
+        self._invalidate_ledger_cache()
+
+    @api.model
+    def _invalidate_ledger_cache(self):
+        """Rows are only written with SQL, so there is nothing to flush, but
+        cached values must be discarded without invalidating other models.
+        """
+        self.invalidate_cache(
+            ["partner_id", "company_id", "account_id", "bucket", "amount_residual"]
+        )
+
+    @api.model
+    def _insert_rows(self, rows):
+        if not rows:
+            return
+        self.env.cr.execute(
+            """
+            INSERT INTO partner_risk_ledger
+                (partner_id, company_id, account_id, bucket, amount_residual)
+            VALUES {}
+            """.format(
+                ", ".join(["%s"] * len(rows))
+            ),
+            rows,
+        )
+
+    @api.model
+    def _rebuild(self, companies=None):
+        """Full rebuild of the ledger. Consistency fallback for the
+        incremental updates.
+        """
+        companies = companies or self._get_ledger_companies()
+        self.flush()
+        self.env.cr.execute(
+            """
+            SELECT partner_id
+            FROM account_move_line
+            WHERE partner_id IS NOT NULL
+                AND account_internal_type = 'receivable'
+                AND company_id IN %s
+            UNION
+            SELECT partner_id
+            FROM partner_risk_ledger
+            WHERE company_id IN %s
+            """,
+            (tuple(companies.ids), tuple(companies.ids)),
+        )
+        partner_ids = [row[0] for row in self.env.cr.fetchall()]
+        _logger.info("Rebuilding partner risk ledger for %s partners", len(partner_ids))
+        self.env.cr.execute(
+            "DELETE FROM partner_risk_ledger WHERE company_id IN %s",
+            (tuple(companies.ids),),
+        )
+        self._invalidate_ledger_cache()
+        for chunk in split_every(self._rebuild_chunk_size, partner_ids):
+            self._refresh_partners(chunk, companies=companies)
+            self._notify_partners_modified(chunk)
+        for company in companies:
+            company.risk_ledger_max_date = self._get_company_max_date(company)
+
+    @api.model
+    def _get_company_max_date(self, company):
+        return fields.Date.to_date(
+            self.env["res.partner"]
+            .sudo()
+            .with_context(allowed_company_ids=company.ids)
+            ._max_risk_date_due()
+        )
+
+    @api.model
+    def _rollover(self, companies=None):
+        """Schedule the recompute of the partners with lines that have crossed
+        the maturity margin since the last rollover, so their residuals are
+        moved between the open and unpaid buckets.
+
+        :return: partner.risk.recompute.job recordset
+        """
+        job_model = self.env["partner.risk.recompute.job"].sudo()
+        jobs = job_model.browse()
+        for company in companies or self._get_ledger_companies():
+            max_date = self._get_company_max_date(company)
+            last_date = company.risk_ledger_max_date
+            if last_date == max_date or job_model.search_count(
+                [
+                    ("company_id", "=", company.id),
+                    ("state", "in", ["pending", "in_progress"]),
+                    ("max_date", "=", max_date),
+                ]
+            ):
+                continue
+            if last_date:
+                date_from = min(last_date, max_date)
+                date_to = max(last_date, max_date)
+            else:
+                date_from = date_to = False
+            jobs |= job_model._schedule(company, date_from, date_to, max_date)
+        return jobs
+
+    @api.model
+    def _cron_rebuild(self):
+        self._rebuild()
+
+    @api.model
+    def _cron_rollover(self):
+        # Jobs are processed by their own scheduled action
+        self._rollover()
+        self.env["res.partner"].sudo()._refresh_risk_rates()
@@ -0,0 +1,84 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import logging
+import threading
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class PartnerRiskLedgerQueue(models.Model):
+    """Partners whose risk ledger refresh has been deferred to a follow-up
+    job. There is only one row by partner, so every partner is refreshed
+    once no matter how many times it has been queued.
+    """
+
+    _name = "partner.risk.ledger.queue"
+    _description = "Partner Risk Ledger Queue"
+    _log_access = False
+    _queue_chunk_size = 1000
+
+    partner_id = fields.Many2one(
+        comodel_name="res.partner", required=True, ondelete="cascade"
+    )
+
+    _sql_constraints = [
+        ("partner_uniq", "unique(partner_id)", "Partner already queued.")
+    ]
+
+    @api.model
+    def _enqueue(self, partner_ids):
+        partner_ids = sorted(partner_ids)
+        if not partner_ids:
+            return
+        self.env.cr.execute(
+            """
+            INSERT INTO partner_risk_ledger_queue (partner_id)
+            SELECT unnest(%s)
+            ON CONFLICT (partner_id) DO NOTHING
+            """,
+            (partner_ids,),
+        )
+        self.env.ref(
+            "account_financial_risk.ir_cron_partner_risk_ledger_queue"
+        ).sudo()._trigger()
+
+    @api.model
+    def _process_queue(self, chunk_size=None):
+        """Refresh the ledger of the queued partners in chunks, committing
+        every chunk. Rows locked by another worker are skipped.
+        """
+        chunk_size = chunk_size or self._queue_chunk_size
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
+        ledger_model = self.env["partner.risk.ledger"]
+        done_count = 0
+        while True:
+            self.env.cr.execute(
+                """
+                SELECT partner_id
+                FROM partner_risk_ledger_queue
+                ORDER BY partner_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (chunk_size,),
+            )
+            partner_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not partner_ids:
+                break
+            ledger_model._refresh_partners(partner_ids)
+            ledger_model._notify_partners_modified(partner_ids)
+            self.env.cr.execute(
+                "DELETE FROM partner_risk_ledger_queue WHERE partner_id IN %s",
+                (tuple(partner_ids),),
+            )
+            done_count += len(partner_ids)
+            if auto_commit:
+                self.flush()
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+        if done_count:
+            _logger.info(
+                "Partner risk ledger refreshed for %s queued partners", done_count
+            )
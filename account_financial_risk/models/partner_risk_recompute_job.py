@@ -0,0 +1,213 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import logging
+import threading
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class PartnerRiskRecomputeJob(models.Model):
+    """Background recompute of the partner risk ledger of a company, done in
+    chunks of partners that are committed one by one, so it can be resumed
+    from the last committed chunk after a crash or a restart.
+    """
+
+    _name = "partner.risk.recompute.job"
+    _description = "Partner Risk Recompute Job"
+    _order = "id desc"
+
+    company_id = fields.Many2one(
+        comodel_name="res.company", required=True, readonly=True, ondelete="cascade"
+    )
+    state = fields.Selection(
+        selection=[
+            ("pending", "Pending"),
+            ("in_progress", "In Progress"),
+            ("done", "Done"),
+            ("cancel", "Cancelled"),
+        ],
+        default="pending",
+        required=True,
+        readonly=True,
+    )
+    date_from = fields.Date(
+        readonly=True,
+        help="Only partners with open lines maturing from this date are "
+        "recomputed. Empty to recompute all the partners.",
+    )
+    date_to = fields.Date(readonly=True)
+    max_date = fields.Date(
+        string="Maturity Date",
+        readonly=True,
+        help="Maturity date set on the company when the job is done.",
+    )
+    total = fields.Integer(string="Total Partners", readonly=True)
+    done_count = fields.Integer(string="Done Partners", readonly=True)
+    last_partner_id = fields.Integer(
+        readonly=True, help="Last partner id of the last committed chunk."
+    )
+    progress = fields.Float(compute="_compute_progress")
+    date_start = fields.Datetime(readonly=True)
+    date_end = fields.Datetime(readonly=True)
+    date_eta = fields.Datetime(string="ETA", compute="_compute_progress")
+
+    @api.depends("total", "done_count", "date_start", "state")
+    def _compute_progress(self):
+        now = fields.Datetime.now()
+        for job in self:
+            job.progress = job.total and 100.0 * job.done_count / job.total or 0.0
+            job.date_eta = False
+            if job.state == "in_progress" and job.done_count and job.date_start:
+                elapsed = now - job.date_start
+                job.date_eta = now + elapsed * (
+                    (job.total - job.done_count) / job.done_count
+                )
+
+    def name_get(self):
+        return [
+            (job.id, "{} ({})".format(job.company_id.name, job.max_date or ""))
+            for job in self
+        ]
+
+    def _get_partner_query(self):
+        """SQL condition and params that select the partners of the job"""
+        self.ensure_one()
+        query = """
+            FROM account_move_line
+            WHERE company_id = %s
+                AND partner_id IS NOT NULL
+                AND account_internal_type = 'receivable'
+        """
+        params = [self.company_id.id]
+        if self.date_from and self.date_to:
+            query += """
+                AND reconciled IS NOT TRUE
+                AND parent_state = 'posted'
+                AND COALESCE(date_maturity, date) >= %s
+                AND COALESCE(date_maturity, date) < %s
+            """
+            params += [self.date_from, self.date_to]
+        return query, params
+
+    def _next_partner_ids(self, limit):
+        query, params = self._get_partner_query()
+        self.env.cr.execute(
+            "SELECT DISTINCT partner_id "
+            + query
+            + " AND partner_id > %s ORDER BY partner_id LIMIT %s",
+            params + [self.last_partner_id, limit],
+        )
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def _schedule(self, company, date_from, date_to, max_date):
+        """Create a job replacing the unfinished ones of the company and
+        trigger the job processing scheduled action.
+
+        The range of the new job covers the ranges of the replaced jobs, as
+        they may have already refreshed some partners.
+        """
+        unfinished_jobs = self.search(
+            [
+                ("company_id", "=", company.id),
+                ("state", "in", ["pending", "in_progress"]),
+            ]
+        )
+        for old_job in unfinished_jobs:
+            if not (date_from and old_job.date_from):
+                date_from = date_to = False
+                break
+            date_from = min(date_from, old_job.date_from)
+            date_to = max(date_to, old_job.date_to)
+        unfinished_jobs.write({"state": "cancel"})
+        job = self.create(
+            {
+                "company_id": company.id,
+                "date_from": date_from,
+                "date_to": date_to,
+                "max_date": max_date,
+            }
+        )
+        self.env["account.move.line"].flush()
+        query, params = job._get_partner_query()
+        self.env.cr.execute("SELECT COUNT(DISTINCT partner_id) " + query, params)
+        job.total = self.env.cr.fetchone()[0]
+        self.env.ref(
+            "account_financial_risk.ir_cron_partner_risk_recompute_job"
+        )._trigger()
+        return job
+
+    def _claim(self):
+        """Lock the row of the job unless another worker is processing it.
+        Run first in a transaction, so the job is read as last committed.
+
+        :return: True if the job is claimed and still has to be processed
+        """
+        self.ensure_one()
+        self.env.cr.execute(
+            """
+            SELECT id
+            FROM partner_risk_recompute_job
+            WHERE id = %s AND state IN ('pending', 'in_progress')
+            FOR UPDATE SKIP LOCKED
+            """,
+            (self.id,),
+        )
+        claimed = bool(self.env.cr.fetchone())
+        self.invalidate_cache(ids=self.ids)
+        return claimed
+
+    def _process(self, chunk_size=1000):
+        """Process the jobs claiming them again after every committed chunk,
+        so a job is never processed by two workers at the same time.
+        """
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
+        ledger_model = self.env["partner.risk.ledger"]
+        for job in self:
+            claimed = job._claim()
+            if claimed:
+                job.write(
+                    {
+                        "state": "in_progress",
+                        "date_start": job.date_start or fields.Datetime.now(),
+                    }
+                )
+            while claimed:
+                partner_ids = job._next_partner_ids(chunk_size)
+                if not partner_ids:
+                    break
+                ledger_model._refresh_partners(partner_ids, companies=job.company_id)
+                ledger_model._notify_partners_modified(partner_ids)
+                job.write(
+                    {
+                        "last_partner_id": partner_ids[-1],
+                        "done_count": job.done_count + len(partner_ids),
+                    }
+                )
+                if auto_commit:
+                    job.flush()
+                    self.env.cr.commit()  # pylint: disable=invalid-commit
+                    claimed = job._claim()
+            if not claimed:
+                continue
+            if job.max_date:
+                job.company_id.risk_ledger_max_date = job.max_date
+            job.write({"state": "done", "date_end": fields.Datetime.now()})
+            _logger.info(
+                "Partner risk recompute of company %s done for %s partners",
+                job.company_id.name,
+                job.done_count,
+            )
+            if auto_commit:
+                job.flush()
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+
+    @api.model
+    def _process_jobs(self):
+        """Process pending jobs and resume the interrupted ones"""
+        self.search(
+            [("state", "in", ["pending", "in_progress"])], order="id"
+        )._process()
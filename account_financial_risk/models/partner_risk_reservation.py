@@ -0,0 +1,264 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+
+class PartnerRiskReservation(models.Model):
+    """Risk reserved by the documents being confirmed.
+
+    The reservation is committed in its own short transaction right after
+    checking the partner headroom, so concurrent confirmations of the same
+    partner take it into account before the document itself is committed.
+    Only the check and the insert are serialized, with an advisory lock by
+    partner, so confirmations of different partners never wait for each
+    other.
+
+    A reservation stops counting as soon as its document is seen confirmed,
+    and expired reservations of documents never confirmed are removed by a
+    scheduled action. As the main transaction doesn't see the reservations
+    committed after it started, they are converted and released in their own
+    transaction too.
+    """
+
+    _name = "partner.risk.reservation"
+    _description = "Partner Risk Reservation"
+    _log_access = False
+    _order = "id"
+    _reservation_ttl = 600
+
+    partner_id = fields.Many2one(
+        comodel_name="res.partner",
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete="cascade",
+    )
+    risk_field = fields.Char(
+        required=True,
+        readonly=True,
+        help="Risk field of the partner increased by the document",
+    )
+    currency_id = fields.Many2one(related="partner_id.risk_currency_id")
+    amount = fields.Monetary(readonly=True)
+    res_model = fields.Char(string="Document Model", required=True, readonly=True)
+    res_id = fields.Many2oneReference(
+        string="Document", model_field="res_model", required=True, readonly=True
+    )
+    state = fields.Selection(
+        selection=[("reserved", "Reserved"), ("converted", "Converted")],
+        default="reserved",
+        required=True,
+        readonly=True,
+    )
+    expiration_date = fields.Datetime(required=True, readonly=True, index=True)
+
+    def init(self):
+        self.env.cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS partner_risk_reservation_res_index
+            ON partner_risk_reservation (res_model, res_id)
+            """
+        )
+
+    @api.model
+    def _use_reservation_main_cursor(self):
+        """Tests use the main cursor, so their data is rolled back"""
+        return getattr(threading.current_thread(), "testing", False)
+
+    @contextmanager
+    def _reservation_cursor(self):
+        """Autocommit cursor, so every reservation is visible to the other
+        transactions as soon as it is inserted, updated or deleted.
+        """
+        if self._use_reservation_main_cursor():
+            yield self.env.cr
+            return
+        with self.pool.cursor() as cr:
+            cr.autocommit(True)
+            yield cr
+
+    @api.model
+    def _simulate_and_reserve(self, records, documents):
+        """Evaluate a batch of documents as simulate_risk does, adding the
+        reservations of the documents being confirmed by other transactions,
+        and reserve the amounts of the accepted ones.
+
+        The risk of every commercial partner is read once. Partners are
+        locked, their reservations read and the new ones inserted once for
+        the whole batch. Partners without limits reserve nothing.
+
+        :param records: recordset of the documents, aligned with documents
+        :param documents: list of dicts as given to res.partner.simulate_risk
+        :return: list of exception messages aligned with documents, empty
+                 strings for the reserved ones
+        """
+        if not documents:
+            return []
+        partner_model = self.env["res.partner"]
+        partners = partner_model.browse(
+            [document["partner_id"] for document in documents]
+        )
+        commercial_ids = [partner.commercial_partner_id.id for partner in partners]
+        states = partners.commercial_partner_id._read_risk_states()
+        partner_ids = sorted(
+            partner_id
+            for partner_id, state in states.items()
+            if partner_model._has_risk_limits(state)
+        )
+        if not partner_ids:
+            # Nothing to check, so nothing to reserve
+            results = partner_model.simulate_risk(documents, states=states)
+            return [res["exception_msg"] for res in results]
+        limited_ids = set(partner_ids)
+        doc_types = partner_model._get_risk_simulation_types()
+        with self._reservation_cursor() as cr:
+            cr.execute(
+                """
+                SELECT pg_advisory_lock(
+                    'partner_risk_reservation'::regclass::integer, partner_id
+                )
+                FROM unnest(%s) AS partner_id
+                """,
+                (partner_ids,),
+            )
+            try:
+                for partner_id, fname, amount in self._get_pending_reservations(
+                    cr, partner_ids, records
+                ):
+                    partner_model._apply_risk_simulation(
+                        states[partner_id], fname, amount
+                    )
+                results = partner_model.simulate_risk(documents, states=states)
+                expiration_date = fields.Datetime.now() + timedelta(
+                    seconds=self._reservation_ttl
+                )
+                rows = [
+                    (
+                        commercial_id,
+                        doc_types[document["type"]][0],
+                        res["risk_amount"],
+                        record._name,
+                        record.id,
+                        "reserved",
+                        expiration_date,
+                    )
+                    for record, document, res, commercial_id in zip(
+                        records, documents, results, commercial_ids
+                    )
+                    if not res["exception"] and commercial_id in limited_ids
+                ]
+                cr.execute(
+                    """
+                    DELETE FROM partner_risk_reservation
+                    WHERE res_model = %s AND res_id IN %s
+                    """,
+                    (records._name, tuple(records.ids)),
+                )
+                if rows:
+                    cr.execute(
+                        """
+                        INSERT INTO partner_risk_reservation
+                            (partner_id, risk_field, amount, res_model, res_id,
+                            state, expiration_date)
+                        VALUES {}
+                        """.format(
+                            ", ".join(["%s"] * len(rows))
+                        ),
+                        rows,
+                    )
+            finally:
+                cr.execute(
+                    """
+                    SELECT pg_advisory_unlock(
+                        'partner_risk_reservation'::regclass::integer, partner_id
+                    )
+                    FROM unnest(%s) AS partner_id
+                    """,
+                    (partner_ids,),
+                )
+        return [res["exception_msg"] for res in results]
+
+    @api.model
+    def _get_pending_reservations(self, cr, partner_ids, records):
+        """Reservations of the partners whose documents are not confirmed yet
+        for the current transaction, so they aren't included in its risk.
+        The reservations of records are left out, as they are evaluated again.
+
+        :return: list of tuples (partner_id, risk_field, amount)
+        """
+        cr.execute(
+            """
+            SELECT partner_id, res_model, res_id, risk_field, amount
+            FROM partner_risk_reservation
+            WHERE partner_id IN %s
+                AND expiration_date > %s
+                AND NOT (res_model = %s AND res_id IN %s)
+            """,
+            (
+                tuple(partner_ids),
+                fields.Datetime.now(),
+                records._name,
+                tuple(records.ids),
+            ),
+        )
+        rows = cr.fetchall()
+        settled = set()
+        for res_model in {row[1] for row in rows}:
+            if res_model not in self.env:
+                continue
+            documents = self.env[res_model].browse(
+                {row[2] for row in rows if row[1] == res_model}
+            )
+            existing = documents.exists()
+            settled |= {(res_model, res_id) for res_id in (documents - existing).ids}
+            settled |= {
+                (res_model, res_id)
+                for res_id in existing._filter_risk_reservation_settled().ids
+            }
+        return [
+            (row[0], row[3], row[4]) for row in rows if (row[1], row[2]) not in settled
+        ]
+
+    @api.model
+    def _convert(self, documents):
+        """Mark the reservations of confirmed documents as converted. They
+        are counted in the partner risk from now on.
+        """
+        if not documents:
+            return
+        with self._reservation_cursor() as cr:
+            cr.execute(
+                """
+                UPDATE partner_risk_reservation
+                SET state = 'converted'
+                WHERE res_model = %s AND res_id IN %s
+                """,
+                (documents._name, tuple(documents.ids)),
+            )
+        self.invalidate_cache(["state"])
+
+    @api.model
+    def _release(self, documents):
+        """Remove the reservations of documents that won't be confirmed"""
+        if not documents:
+            return
+        with self._reservation_cursor() as cr:
+            cr.execute(
+                """
+                DELETE FROM partner_risk_reservation
+                WHERE res_model = %s AND res_id IN %s
+                """,
+                (documents._name, tuple(documents.ids)),
+            )
+
+    @api.model
+    def _cron_remove_expired(self):
+        self.env.cr.execute(
+            "DELETE FROM partner_risk_reservation WHERE expiration_date <= %s",
+            (fields.Datetime.now(),),
+        )
@@ -0,0 +1,132 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import logging
+
+from odoo import api, fields, models
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+
+class PartnerRiskSnapshot(models.Model):
+    """Daily values of the partner risk fields.
+
+    One row by date, partner and risk field for every partner with any risk
+    or credit limit, zero values included, so averages by period count every
+    day. Rows are inserted in date order, so a BRIN index on the date is
+    enough to read any period without touching account.move.line.
+    """
+
+    _name = "partner.risk.snapshot"
+    _description = "Partner Risk Snapshot"
+    _log_access = False
+    _order = "date desc, partner_id"
+    _snapshot_chunk_size = 1000
+
+    date = fields.Date(required=True, readonly=True)
+    partner_id = fields.Many2one(
+        comodel_name="res.partner",
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete="cascade",
+    )
+    risk_field = fields.Selection(
+        selection="_get_risk_field_selection", required=True, readonly=True
+    )
+    currency_id = fields.Many2one(comodel_name="res.currency", readonly=True)
+    amount = fields.Monetary(readonly=True)
+    # Same daily balance, aggregated by period it is the average balance
+    average_amount = fields.Monetary(
+        string="Daily Average", readonly=True, group_operator="avg"
+    )
+
+    def init(self):
+        self.env.cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS partner_risk_snapshot_date_brin_index
+            ON partner_risk_snapshot USING brin (date)
+            """
+        )
+
+    @api.model
+    def _get_snapshot_fields(self):
+        partner_model = self.env["res.partner"]
+        return [x[0] for x in partner_model._risk_field_list()] + [
+            "risk_total",
+            "credit_limit",
+        ]
+
+    @api.model
+    def _get_risk_field_selection(self):
+        partner_fields = self.env["res.partner"]._fields
+        return [
+            (fname, partner_fields[fname].string)
+            for fname in self._get_snapshot_fields()
+        ]
+
+    @api.model
+    def _get_snapshot_partner_ids(self):
+        """Commercial partners with any risk amount or credit limit"""
+        self.env["res.partner"].flush(["credit_limit", "risk_total"])
+        self.env.cr.execute(
+            """
+            SELECT partner_id
+            FROM partner_risk_ledger
+            UNION
+            SELECT id
+            FROM res_partner
+            WHERE (credit_limit != 0 OR risk_total != 0)
+                AND id = commercial_partner_id
+            """
+        )
+        return sorted(row[0] for row in self.env.cr.fetchall())
+
+    @api.model
+    def _take_snapshot(self, date=None):
+        """Store the risk values of the day. Taking it twice the same day
+        replaces the previous values.
+        """
+        date = date or fields.Date.context_today(self)
+        snapshot_fields = self._get_snapshot_fields()
+        self.env["partner.risk.ledger"]._process_pending()
+        self.flush()
+        self.env.cr.execute(
+            "DELETE FROM partner_risk_snapshot WHERE date = %s", (date,)
+        )
+        partner_ids = self._get_snapshot_partner_ids()
+        _logger.info("Partner risk snapshot for %s partners", len(partner_ids))
+        # Read in the same context than the stored risk_total
+        partner_model = self.env["res.partner"]._with_risk_context()
+        for chunk in split_every(self._snapshot_chunk_size, partner_ids):
+            partners = partner_model.browse(chunk)
+            rows = []
+            for vals in partners.read(snapshot_fields + ["risk_currency_id"]):
+                currency_id = vals["risk_currency_id"] and vals["risk_currency_id"][0]
+                rows.extend(
+                    (date, vals["id"], fname, currency_id, vals[fname], vals[fname])
+                    for fname in snapshot_fields
+                )
+            self._insert_rows(rows)
+            partners.invalidate_cache()
+        self.invalidate_cache()
+
+    @api.model
+    def _insert_rows(self, rows):
+        if not rows:
+            return
+        self.env.cr.execute(
+            """
+            INSERT INTO partner_risk_snapshot
+                (date, partner_id, risk_field, currency_id, amount, average_amount)
+            VALUES {}
+            """.format(
+                ", ".join(["%s"] * len(rows))
+            ),
+            rows,
+        )
+
+    @api.model
+    def _cron_take_snapshot(self):
+        self._take_snapshot()
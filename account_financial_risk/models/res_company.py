@@ -10,8 +10,8 @@ class ResCompany(models.Model):
     invoice_unpaid_margin = fields.Integer(
         string="Maturity Margin",
         help="Days after due date to set an invoice as unpaid. "
-        "The change of this field recompute all partners risk, "
-        "be patient.",
+        "The change of this field schedules a background recompute of "
+        "the partners risk.",
     )
     allow_overrisk_invoice_validation = fields.Boolean(
         string="Allow invoice validation over the risk",
@@ -19,3 +19,15 @@ class ResCompany(models.Model):
         "Useful when the flow comes from sales orders and the over-risk "
         "has already been allowed when confirming these.",
     )
+    risk_ledger_max_date = fields.Date(
+        string="Risk Ledger Maturity Date",
+        readonly=True,
+        help="Maturity date that splits open and unpaid amounts in the "
+        "partner risk ledger, updated by the daily rollover.",
+    )
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "invoice_unpaid_margin" in vals:
+            self.env["partner.risk.ledger"]._rollover(companies=self.sudo())
+        return res
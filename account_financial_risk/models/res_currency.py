@@ -0,0 +1,87 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from collections import defaultdict
+
+from odoo import api, fields, models
+
+RATES_KEY = "account_financial_risk.rates"
+
+
+class ResCurrency(models.Model):
+    _inherit = "res.currency"
+
+    @api.model
+    def _get_risk_rate_cache(self):
+        """Conversion rates resolved in the current transaction, by
+        (from currency id, to currency id, company id, date).
+        """
+        return self.env.cr.precommit.data.setdefault(RATES_KEY, {})
+
+    @api.model
+    def _clear_risk_rate_cache(self):
+        self.env.cr.precommit.data.pop(RATES_KEY, None)
+
+    @api.model
+    def _risk_rate_key(self, from_currency, to_currency, company, date):
+        return (
+            from_currency.id,
+            to_currency.id,
+            company.id,
+            fields.Date.to_date(date),
+        )
+
+    @api.model
+    def _preload_risk_rates(self, keys):
+        """Resolve with one query by company and date all the conversion rates
+        needed by a batch.
+
+        :param keys: iterable of tuples (from currency, to currency, company,
+                     date)
+        """
+        cache = self._get_risk_rate_cache()
+        missing = defaultdict(set)
+        for from_currency, to_currency, company, date in keys:
+            if not from_currency or not to_currency or from_currency == to_currency:
+                continue
+            key = self._risk_rate_key(from_currency, to_currency, company, date)
+            if key not in cache:
+                missing[(key[2], key[3])].add(key)
+        for (company_id, date), rate_keys in missing.items():
+            currency_ids = {key[0] for key in rate_keys} | {key[1] for key in rate_keys}
+            rates = self.browse(currency_ids)._get_rates(
+                self.env["res.company"].browse(company_id), date
+            )
+            for key in rate_keys:
+                cache[key] = rates[key[1]] / rates[key[0]]
+
+    def _risk_convert(self, from_amount, to_currency, company, date):
+        """Same as _convert without rounding, but using the rates cached in
+        the transaction.
+        """
+        from_currency = self or to_currency
+        to_currency = to_currency or from_currency
+        if from_currency == to_currency:
+            return from_amount
+        key = self._risk_rate_key(from_currency, to_currency, company, date)
+        cache = self._get_risk_rate_cache()
+        if key not in cache:
+            self._preload_risk_rates([(from_currency, to_currency, company, date)])
+        return from_amount * cache[key]
+
+
+class ResCurrencyRate(models.Model):
+    _inherit = "res.currency.rate"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env["res.currency"]._clear_risk_rate_cache()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        self.env["res.currency"]._clear_risk_rate_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env["res.currency"]._clear_risk_rate_cache()
+        return super().unlink()
@@ -1,10 +1,13 @@
 # Copyright 2016-2021 Tecnativa - Carlos Dauden
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
+from collections import defaultdict
+
 from dateutil.relativedelta import relativedelta
 
 from odoo import _, api, fields, models
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import split_every
 
 
 class ResPartner(models.Model):
@@ -114,17 +117,20 @@ class ResPartner(models.Model):
         string="Total Risk",
         currency_field="risk_currency_id",
         help="Sum of total risk included",
+        store=True,
     )
     risk_exception = fields.Boolean(
         compute="_compute_risk_exception",
-        search="_search_risk_exception",
         string="Risk Exception",
         help="It Indicate if partner risk exceeded",
+        store=True,
+        index=True,
     )
     risk_amount_exceeded = fields.Monetary(
         string="Risk Over Limit",
         currency_field="risk_currency_id",
         compute="_compute_risk_exception",
+        store=True,
     )
     credit_policy = fields.Char()
     risk_allow_edit = fields.Boolean(compute="_compute_risk_allow_edit")
@@ -158,6 +164,25 @@ class ResPartner(models.Model):
         string="Risk Remaining (Percentage)",
         store=True,
     )
+    risk_group_credit_limit = fields.Monetary(
+        string="Group Credit Limit",
+        currency_field="risk_currency_id",
+        tracking=True,
+        help="Limit of the total risk of this partner and all its descendants "
+        "in the partners hierarchy. Set 0 if it is not locked.",
+    )
+    risk_group_total = fields.Monetary(
+        compute="_compute_risk_group",
+        string="Group Total Risk",
+        currency_field="risk_currency_id",
+        help="Sum of the total risk of this partner and all its descendants "
+        "in the partners hierarchy.",
+    )
+    risk_group_exception = fields.Boolean(
+        compute="_compute_risk_group",
+        string="Group Risk Exception",
+        help="It indicates if the group credit limit is exceeded",
+    )
 
     @api.depends("credit_limit", "risk_total")
     def _compute_risk_remaining(self):
@@ -172,13 +197,134 @@ class ResPartner(models.Model):
             else:
                 record.risk_remaining_percentage = 0
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        partners = super().create(vals_list)
+        self.env["partner.risk.closure"]._add_partners(partners.sorted("id"))
+        return partners
+
+    def write(self, vals):
+        if "parent_id" in vals:
+            self._invalidate_risk_group_ancestors()
+        res = super().write(vals)
+        if "parent_id" in vals:
+            self.env["partner.risk.closure"]._move_partners(self)
+        if "parent_id" in vals or not set(
+            self._get_depends_compute_risk_exception()
+        ).isdisjoint(vals):
+            self._invalidate_risk_group_ancestors()
+        return res
+
+    @api.depends("risk_group_credit_limit", "risk_total")
+    def _compute_risk_group(self):
+        """Roll up the total risk of every partner subtree with one query
+        on the partners hierarchy closure table.
+        """
+        self.update({"risk_group_total": 0.0, "risk_group_exception": False})
+        partners = self.filtered("id")
+        if not partners:
+            return
+        self.flush(["risk_total", "parent_id", "commercial_partner_id"])
+        self.env.cr.execute(
+            """
+            SELECT closure.ancestor_id, partner.id, partner.risk_total
+            FROM partner_risk_closure closure
+            JOIN res_partner partner ON partner.id = closure.descendant_id
+            WHERE closure.ancestor_id IN %s
+                AND partner.id = partner.commercial_partner_id
+                AND partner.risk_total != 0
+            """,
+            (tuple(partners.ids),),
+        )
+        rows = self.env.cr.fetchall()
+        risk_partners = self._with_risk_context()
+        descendants = {
+            partner.id: partner
+            for partner in risk_partners.browse({row[1] for row in rows})
+        }
+        company = risk_partners.env.company
+        today = fields.Date.context_today(risk_partners)
+        ancestors = {
+            partner.id: partner for partner in risk_partners.browse(partners.ids)
+        }
+        self.env["res.currency"]._preload_risk_rates(
+            {
+                (
+                    descendants[descendant_id].risk_currency_id,
+                    ancestors[ancestor_id].risk_currency_id,
+                    company,
+                    today,
+                )
+                for ancestor_id, descendant_id, _risk_total in rows
+            }
+        )
+        totals = defaultdict(float)
+        for ancestor_id, descendant_id, risk_total in rows:
+            currency = descendants[descendant_id].risk_currency_id
+            totals[ancestor_id] += currency._risk_convert(
+                risk_total, ancestors[ancestor_id].risk_currency_id, company, today
+            )
+        for partner in partners:
+            partner.risk_group_total = totals[partner.id]
+            partner.risk_group_exception = bool(
+                partner.risk_group_credit_limit
+                and partner.risk_group_total > partner.risk_group_credit_limit
+            )
+
+    def _invalidate_risk_group_ancestors(self):
+        """Discard the cached group risk of the ancestors of the partners,
+        as it depends on their risk.
+        """
+        group_fnames = ["risk_group_total", "risk_group_exception"]
+        if not any(
+            self.env.cache.get_records(self, self._fields[fname])
+            for fname in group_fnames
+        ):
+            return
+        ancestor_ids = self.env["partner.risk.closure"]._get_ancestor_ids(
+            self.filtered("id").ids
+        )
+        self.invalidate_cache(fnames=group_fnames, ids=ancestor_ids)
+
+    def _filter_risk_group_exception(self):
+        """Partners of self with any ancestor, or themselves, over their
+        group credit limit.
+        """
+        if not self:
+            return self
+        self.flush(["risk_group_credit_limit", "risk_total"])
+        self.env.cr.execute(
+            """
+            SELECT closure.descendant_id, closure.ancestor_id
+            FROM partner_risk_closure closure
+            JOIN res_partner ancestor ON ancestor.id = closure.ancestor_id
+            WHERE closure.descendant_id IN %s
+                AND ancestor.risk_group_credit_limit != 0
+            """,
+            (tuple(self.ids),),
+        )
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return self.browse()
+        ancestors = self.browse({row[1] for row in rows})
+        exception_ids = set(ancestors.filtered("risk_group_exception").ids)
+        return self.browse(
+            {
+                descendant_id
+                for descendant_id, ancestor_id in rows
+                if ancestor_id in exception_ids
+            }
+        )
+
     @api.depends(
         "credit_currency",
         "manual_credit_currency_id",
         "property_account_receivable_id.currency_id",
+        "property_product_pricelist.currency_id",
         "country_id",
         "company_id.currency_id",
     )
+    @api.depends_context("company")
     def _compute_credit_currency(self):
         for partner in self:
             if partner.credit_currency == "manual":
@@ -232,6 +378,23 @@ class ResPartner(models.Model):
     def _get_risk_company_domain(self):
         return [("company_id", "in", self.env.companies.ids)]
 
+    @api.model
+    def _get_risk_reference_company(self):
+        """Company whose currency rates and due margin are used by the stored
+        risk, so it doesn't depend on the user that triggers its recompute.
+        """
+        return self.env["res.company"].sudo().search([], order="id", limit=1)
+
+    def _with_risk_context(self):
+        """Self in the fixed context of the stored risk: superuser, all the
+        companies with the reference company as current one and dates in UTC.
+        """
+        companies = self.env["res.company"].sudo().search([], order="id")
+        reference = self._get_risk_reference_company()
+        return self.sudo().with_context(
+            allowed_company_ids=(reference | companies).ids, tz="UTC"
+        )
+
     def _get_field_risk_model_domain(self, field_name):
         """Returns a tuple with model name and domain"""
         risk_account_groups = self._risk_account_groups()
@@ -303,11 +466,10 @@ class ResPartner(models.Model):
             },
         }
 
-    @api.depends(
-        "move_line_ids.amount_residual",
-        "move_line_ids.date_maturity",
-        "company_id.invoice_unpaid_margin",
-    )
+    # Changes of the receivable lines are notified by the partner risk
+    # ledger, once by partner and transaction, and the changes of the due
+    # margin by the rollover jobs scheduled when it is written
+    @api.depends_context("allowed_company_ids", "tz")
     def _compute_risk_account_amount(self):
         self.update(
             {
@@ -318,24 +480,81 @@ class ResPartner(models.Model):
                 "risk_account_amount_unpaid": 0.0,
             }
         )
-        AccountMoveLine = self.env["account.move.line"].sudo()
         customers = self.filtered(
             lambda p: p == p.commercial_partner_id
             or (p._origin and p._origin.id in p.commercial_partner_id.ids)
         )
         if not customers:
             return  # pragma: no cover
+        for partner, partner_groups in customers._get_risk_partner_groups():
+            partner.update(partner._prepare_risk_account_vals(partner_groups))
+
+    def _get_risk_partner_groups(self):
+        """Read the risk ledger of all the partners at once.
+
+        :return: list of tuples (partner, groups) where the "read_group" key
+                 of every group only has the rows of the partner.
+        """
         groups = self._risk_account_groups()
-        for _key, group in groups.items():
-            group["read_group"] = AccountMoveLine.read_group(
-                group["domain"] + [("partner_id", "in", customers.ids)],
-                group["fields"],
-                group["group_by"],
-                orderby="id",
-                lazy=False,
+        partner_index = self._read_risk_ledger(groups, self)
+        companies = self._get_risk_index_companies(partner_index)
+        self._preload_risk_account_rates(companies)
+        # Receivable account of every partner by company, read by
+        # _prepare_risk_account_vals_by_company, with one query by company
+        for company in companies:
+            self.with_company(company).mapped("property_account_receivable_id")
+        res = []
+        for partner in self:
+            partner_regs = partner_index.get(partner.id, {})
+            res.append(
+                (
+                    partner,
+                    {
+                        key: dict(group, read_group=partner_regs.get(key, []))
+                        for key, group in groups.items()
+                    },
+                )
             )
-        for partner in customers:
-            partner.update(partner._prepare_risk_account_vals(groups))
+        return res
+
+    @api.model
+    def _read_risk_ledger(self, groups, partners):
+        """Read the amounts stored in the risk ledger for the given partners.
+
+        :return: dict {partner_id: {group_key: [read_group rows]}} so each
+                 partner only receives its own rows in the "read_group" key of
+                 the groups passed to _prepare_risk_account_vals.
+        """
+        RiskLedger = self.env["partner.risk.ledger"].sudo()
+        RiskLedger._process_pending()
+        ledger_groups = RiskLedger.read_group(
+            self._get_risk_company_domain()
+            + [
+                ("partner_id", "in", partners.ids),
+                ("bucket", "in", list(groups.keys())),
+            ],
+            ["bucket", "partner_id", "company_id", "account_id", "amount_residual"],
+            ["bucket", "partner_id", "company_id", "account_id"],
+            orderby="id",
+            lazy=False,
+        )
+        partner_index = defaultdict(lambda: defaultdict(list))
+        for reg in ledger_groups:
+            partner_index[reg["partner_id"][0]][reg["bucket"]].append(reg)
+        return partner_index
+
+    @api.model
+    def _get_risk_account_bucket_fields(self):
+        """Risk fields filled by every ledger bucket.
+
+        :return: dict {bucket: (field for the partner receivable account,
+                 field for other accounts)}
+        """
+        return {
+            "draft": ("risk_invoice_draft", "risk_invoice_draft"),
+            "open": ("risk_invoice_open", "risk_account_amount"),
+            "unpaid": ("risk_invoice_unpaid", "risk_account_amount_unpaid"),
+        }
 
     def _prepare_risk_account_vals(self, groups):
         vals = {
@@ -345,101 +564,376 @@ class ResPartner(models.Model):
             "risk_account_amount": 0.0,
             "risk_account_amount_unpaid": 0.0,
         }
-        # Partner receivable account determines if amount is in invoice field
-        for reg in groups["draft"]["read_group"]:
-            if reg["partner_id"][0] not in self.ids:
-                continue  # pragma: no cover
-            account = self.env["account.account"].browse(reg["account_id"][0])
-            vals["risk_invoice_draft"] += account.company_id.currency_id._convert(
-                reg["amount_residual"],
-                self.risk_currency_id,
-                account.company_id,
-                fields.Date.context_today(self),
-                round=False,
-            )
-        for reg in groups["open"]["read_group"]:
-            if reg["partner_id"][0] not in self.ids:
-                continue  # pragma: no cover
-            account = self.env["account.account"].browse(reg["account_id"][0])
-            if self.property_account_receivable_id.id == reg["account_id"][0]:
-                vals["risk_invoice_open"] += account.company_id.currency_id._convert(
-                    reg["amount_residual"],
-                    self.risk_currency_id,
-                    account.company_id,
-                    fields.Date.context_today(self),
-                    round=False,
-                )
-            else:
-                vals["risk_account_amount"] += account.company_id.currency_id._convert(
-                    reg["amount_residual"],
-                    self.risk_currency_id,
-                    account.company_id,
-                    fields.Date.context_today(self),
-                    round=False,
-                )
-        for reg in groups["unpaid"]["read_group"]:
-            if reg["partner_id"][0] not in self.ids:
-                continue  # pragma: no cover
-            account = self.env["account.account"].browse(reg["account_id"][0])
-            if self.property_account_receivable_id.id == reg["account_id"][0]:
-                vals["risk_invoice_unpaid"] += account.company_id.currency_id._convert(
-                    reg["amount_residual"],
-                    self.risk_currency_id,
-                    account.company_id,
-                    fields.Date.context_today(self),
-                    round=False,
-                )
-            else:
-                vals[
-                    "risk_account_amount_unpaid"
-                ] += account.company_id.currency_id._convert(
-                    reg["amount_residual"],
-                    self.risk_currency_id,
-                    account.company_id,
-                    fields.Date.context_today(self),
-                    round=False,
-                )
+        for company_vals in self._prepare_risk_account_vals_by_company(groups).values():
+            for fname, amount in company_vals.items():
+                vals[fname] += amount
         return vals
 
+    def _prepare_risk_account_vals_by_company(self, groups):
+        """Risk amounts of the partner by company, in the partner risk
+        currency.
+
+        Residuals are summed by company in the company currency and then
+        converted once by company and field.
+
+        :return: dict {company_id: {field name: amount}}
+        """
+        company_amounts = defaultdict(lambda: defaultdict(float))
+        receivable_accounts = {}
+        for key, fnames in self._get_risk_account_bucket_fields().items():
+            for reg in groups[key]["read_group"]:
+                if reg["partner_id"][0] not in self.ids:
+                    continue  # pragma: no cover
+                company_id = reg["company_id"][0]
+                if company_id not in receivable_accounts:
+                    receivable_accounts[company_id] = self.with_company(
+                        company_id
+                    ).property_account_receivable_id.id
+                # Partner receivable account determines if amount is in
+                # invoice field
+                if reg["account_id"][0] == receivable_accounts[company_id]:
+                    fname = fnames[0]
+                else:
+                    fname = fnames[1]
+                company_amounts[company_id][fname] += reg["amount_residual"]
+        date = fields.Date.context_today(self)
+        res = {}
+        for company_id, amounts in company_amounts.items():
+            company = self.env["res.company"].browse(company_id)
+            res[company_id] = {
+                fname: company.currency_id._risk_convert(
+                    amount, self.risk_currency_id, company, date
+                )
+                for fname, amount in amounts.items()
+            }
+        return res
+
+    def get_risk_company_breakdown(self):
+        """Risk amounts of the partners by company, to show or check them
+        alongside the consolidated values of the risk fields.
+
+        :return: dict {partner_id: {company_id: {field name: amount}}} with
+                 the amounts in the risk currency of every partner.
+        """
+        customers = self.commercial_partner_id
+        return {
+            partner.id: partner._prepare_risk_account_vals_by_company(groups)
+            for partner, groups in customers._get_risk_partner_groups()
+        }
+
+    def open_risk_company_breakdown(self):
+        self.ensure_one()
+        action = self.env["ir.actions.actions"]._for_xml_id(
+            "account_financial_risk.partner_risk_ledger_company_action"
+        )
+        action["domain"] = self._get_risk_company_domain() + [
+            ("partner_id", "=", self.commercial_partner_id.id)
+        ]
+        return action
+
+    @api.model
+    def _get_risk_index_companies(self, partner_index):
+        """Companies of the ledger rows given by _read_risk_ledger"""
+        return self.env["res.company"].browse(
+            {
+                reg["company_id"][0]
+                for partner_regs in partner_index.values()
+                for regs in partner_regs.values()
+                for reg in regs
+            }
+        )
+
+    def _preload_risk_account_rates(self, companies):
+        date = fields.Date.context_today(self)
+        self.env["res.currency"]._preload_risk_rates(
+            (company.currency_id, currency, company, date)
+            for company in companies
+            for currency in self.risk_currency_id
+        )
+
     @api.depends(lambda x: x._get_depends_compute_risk_exception())
     def _compute_risk_exception(self):
-        risk_field_list = self._risk_field_list()
-        for partner in self:
-            amount = 0.0
-            amount_exceeded = 0.0
-            risk_exception = False
-            for risk_field in risk_field_list:
-                field_value = getattr(partner, risk_field[0], 0.0)
-                max_value = getattr(partner, risk_field[1], 0.0)
-                include = getattr(partner, risk_field[2], False)
-                if max_value and field_value > max_value:
-                    risk_exception = True
-                    amount_exceeded += field_value - max_value
-                if include:
-                    amount += field_value
-            if partner.credit_limit and amount > partner.credit_limit:
-                risk_exception = True
-                amount_exceeded = amount - partner.credit_limit
-            partner.risk_total = amount
+        # The stored verdict is evaluated in a fixed context, whoever triggers
+        # the recompute
+        partners = self._with_risk_context()
+        totals, amounts_exceeded, exceptions = partners._get_risk_exception_columns()
+        for partner, total, amount_exceeded, risk_exception in zip(
+            self, totals, amounts_exceeded, exceptions
+        ):
+            partner.risk_total = total
             partner.risk_amount_exceeded = amount_exceeded
             partner.risk_exception = risk_exception
+        self._invalidate_risk_group_ancestors()
+
+    def _get_risk_column(self, field_name, default):
+        """Values of a field for all the partners of self, read at once"""
+        if field_name not in self._fields:
+            return [default] * len(self)
+        return self.mapped(field_name)
+
+    def _get_risk_exception_columns(self):
+        """Evaluate the risk of all the partners of self by columns.
+
+        :return: tuple of lists (risk_total, risk_amount_exceeded,
+                 risk_exception) aligned with self
+        """
+        return self._evaluate_risk_columns(self._read_risk_columns(), len(self))
+
+    def _read_risk_columns(self):
+        """Read every value, limit and include flag of _risk_field_list and
+        the credit limit for the whole batch.
+
+        :return: dict {field name: list of values aligned with self}
+        """
+        columns = {"credit_limit": self.mapped("credit_limit")}
+        for value_fname, limit_fname, include_fname in self._risk_field_list():
+            columns[value_fname] = self._get_risk_column(value_fname, 0.0)
+            columns[limit_fname] = self._get_risk_column(limit_fname, 0.0)
+            columns[include_fname] = self._get_risk_column(include_fname, False)
+        return columns
 
     @api.model
-    def _search_risk_exception(self, operator, value):
-        commercial_partners = self.search(
-            [
-                ("customer_rank", ">", 0),
-                "|",
-                ("is_company", "=", True),
-                ("parent_id", "=", False),
-            ],
-            order="id",
+    def _evaluate_risk_columns(self, columns, count):
+        """Accumulate in lists the total risk, the amount over the limits and
+        the risk exception of count partners given their risk columns.
+        """
+        totals = [0.0] * count
+        amounts_exceeded = [0.0] * count
+        exceptions = [False] * count
+        for value_fname, limit_fname, include_fname in self._risk_field_list():
+            rows = zip(
+                columns[value_fname], columns[limit_fname], columns[include_fname]
+            )
+            for index, (value, limit, include) in enumerate(rows):
+                if limit and value > limit:
+                    exceptions[index] = True
+                    amounts_exceeded[index] += value - limit
+                if include:
+                    totals[index] += value
+        for index, credit_limit in enumerate(columns["credit_limit"]):
+            if credit_limit and totals[index] > credit_limit:
+                exceptions[index] = True
+                amounts_exceeded[index] = totals[index] - credit_limit
+        return totals, amounts_exceeded, exceptions
+
+    def _read_risk_states(self):
+        """Current risk of the partners as plain dicts, to evaluate documents
+        without reading the partners again.
+
+        :return: dict {partner_id: {field name: value}} with the fields of
+                 _risk_field_list, credit_limit, risk_total and
+                 risk_exception
+        """
+        exception_ids = set(self._filter_risk_exception().ids)
+        columns = self._with_risk_context()._read_risk_columns()
+        columns["risk_total"] = self.mapped("risk_total")
+        states = {}
+        for index, partner in enumerate(self):
+            state = {fname: values[index] for fname, values in columns.items()}
+            state["risk_exception"] = partner.id in exception_ids
+            states[partner.id] = state
+        return states
+
+    def _get_invoice_risk_exception_msg(self, risk_amount):
+        """Reason why a new invoice of risk_amount, expressed in the partner
+        risk currency, can't be posted. Empty string if it can.
+        """
+        self.ensure_one()
+        state = self._read_risk_states()[self.id]
+        if state["risk_exception"]:
+            return _("Financial risk exceeded.\n")
+        return self._get_invoice_risk_limit_msg(state, risk_amount)
+
+    @api.model
+    def _get_invoice_risk_limit_msg(self, state, risk_amount):
+        """Reason why an invoice of risk_amount, in the partner risk currency,
+        can't be posted apart from an existing risk exception. Empty string
+        if it can.
+
+        :param state: dict given by _read_risk_states
+        """
+        if state["risk_invoice_open_limit"] and (
+            (state["risk_invoice_open"] + risk_amount)
+            > state["risk_invoice_open_limit"]
+        ):
+            return _("This invoice exceeds the open invoices risk.\n")
+        # If risk_invoice_draft_include this invoice included in risk_total
+        if not state["risk_invoice_draft_include"] and (
+            state["risk_invoice_open_include"]
+            and (state["risk_total"] + risk_amount) > state["credit_limit"]
+        ):
+            return _("This invoice exceeds the financial risk.\n")
+        return ""
+
+    @api.model
+    def _get_risk_simulation_types(self):
+        """Document types accepted by simulate_risk.
+
+        :return: dict {type: (risk field increased by the document, method
+                 that gives the limit exception message)}
+        """
+        return {"invoice": ("risk_invoice_open", "_get_invoice_risk_limit_msg")}
+
+    @api.model
+    def simulate_risk(self, documents, states=None, accumulate=True):
+        """Evaluate an ordered batch of hypothetical documents as if they were
+        confirmed one after another, without writing anything.
+
+        The risk of every partner is read once and every accepted document
+        adds its amount to the partner risk in memory, so the next documents
+        of the same partner are evaluated against it, unless accumulate is
+        False and every document is evaluated on its own.
+
+        :param documents: list of dicts with the keys type (see
+                          _get_risk_simulation_types), partner_id, amount and
+                          optionally currency_id, date and ref.
+        :param states: dict given by _read_risk_states of the commercial
+                       partners, to evaluate the documents from them instead
+                       of reading them. Updated in place.
+        :return: list of dicts with the keys ref, partner_id, exception,
+                 exception_msg, headroom (credit limit less total risk
+                 after the document) and risk_amount (amount of the
+                 document in the partner risk currency), in the same order
+                 as documents.
+        """
+        if not documents:
+            return []
+        doc_types = self._get_risk_simulation_types()
+        for document in documents:
+            if document["type"] not in doc_types:
+                raise UserError(
+                    _("Unknown document type for risk simulation: %s")
+                    % document["type"]
+                )
+        partners = self.browse([document["partner_id"] for document in documents])
+        commercial_partners = [partner.commercial_partner_id for partner in partners]
+        if states is None:
+            states = partners.commercial_partner_id._read_risk_states()
+        # Same conversion as the stored risk verdict
+        risk_partners = self._with_risk_context()
+        company = risk_partners.env.company
+        today = fields.Date.context_today(risk_partners)
+        commercial_partners = [
+            partner.with_env(risk_partners.env) for partner in commercial_partners
+        ]
+        currencies = [
+            self.env["res.currency"].browse(document.get("currency_id") or [])
+            for document in documents
+        ]
+        self.env["res.currency"]._preload_risk_rates(
+            (currency, partner.risk_currency_id, company, document.get("date") or today)
+            for document, currency, partner in zip(
+                documents, currencies, commercial_partners
+            )
         )
-        risk_partner_ids = commercial_partners.filtered("risk_exception").ids
-        if (operator == "=" and value) or (operator == "!=" and not value):
-            return [("id", "in", risk_partner_ids)]
-        else:
-            return [("id", "not in", risk_partner_ids)]
+        res = []
+        for document, currency, partner in zip(
+            documents, currencies, commercial_partners
+        ):
+            state = states[partner.id]
+            if not accumulate:
+                state = dict(state)
+            risk_fname, msg_method = doc_types[document["type"]]
+            risk_amount = currency._risk_convert(
+                document["amount"],
+                partner.risk_currency_id,
+                company,
+                document.get("date") or today,
+            )
+            if state["risk_exception"]:
+                exception_msg = _("Financial risk exceeded.\n")
+            else:
+                exception_msg = getattr(self, msg_method)(state, risk_amount)
+            if not exception_msg:
+                self._apply_risk_simulation(state, risk_fname, risk_amount)
+            res.append(
+                {
+                    "ref": document.get("ref"),
+                    "partner_id": document["partner_id"],
+                    "exception": bool(exception_msg),
+                    "exception_msg": exception_msg,
+                    "headroom": state["credit_limit"] - state["risk_total"],
+                    "risk_amount": risk_amount,
+                }
+            )
+        return res
+
+    @api.model
+    def _has_risk_limits(self, state):
+        """Whether any limit of the partner state can block a document"""
+        return bool(
+            state["credit_limit"]
+            or any(
+                state[limit_fname]
+                for _value, limit_fname, _i in self._risk_field_list()
+            )
+        )
+
+    @api.model
+    def _apply_risk_simulation(self, state, risk_fname, risk_amount):
+        """Add an accepted document to the simulated risk of a partner"""
+        state[risk_fname] += risk_amount
+        totals, amounts_exceeded, exceptions = self._evaluate_risk_columns(
+            {fname: [value] for fname, value in state.items()}, 1
+        )
+        state["risk_total"] = totals[0]
+        state["risk_exception"] = state["risk_exception"] or exceptions[0]
+
+    def _filter_risk_exception(self):
+        """Commercial partners of self in risk exception.
+
+        The stored risk_exception is the verdict shared by all the workers and
+        it is only recomputed when the ledger rows, sales or limits of the
+        partner change, so repeated checks in a transaction are served from
+        the record cache. Pending ledger rows are refreshed at once for the
+        whole batch before reading the verdicts.
+        """
+        partners = self.commercial_partner_id
+        self.env["partner.risk.ledger"].sudo()._process_pending()
+        return (
+            partners.filtered("risk_exception")
+            | partners._filter_risk_group_exception()
+        )
+
+    @api.model
+    def _get_risk_rate_partner_ids(self):
+        """Commercial partners with risk amounts converted from a currency
+        other than the reference company one, whose stored risk changes with
+        the currency rates.
+        """
+        self.flush(["credit_currency", "company_id", "commercial_partner_id"])
+        self.env.cr.execute(
+            """
+            SELECT partner.id
+            FROM res_partner partner
+            LEFT JOIN res_company company ON company.id = partner.company_id
+            WHERE partner.id = partner.commercial_partner_id
+                AND (
+                    COALESCE(partner.credit_currency, 'company') != 'company'
+                    OR COALESCE(company.currency_id, %(currency)s) != %(currency)s
+                    OR EXISTS (
+                        SELECT 1
+                        FROM partner_risk_ledger ledger
+                        JOIN res_company ledger_company
+                            ON ledger_company.id = ledger.company_id
+                        WHERE ledger.partner_id = partner.id
+                            AND ledger_company.currency_id != %(currency)s
+                    )
+                )
+            """,
+            {"currency": self._get_risk_reference_company().currency_id.id},
+        )
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def _refresh_risk_rates(self, chunk_size=1000):
+        """Recompute the stored risk of the partners converted at the rates
+        of another day
+        """
+        ledger_model = self.env["partner.risk.ledger"]
+        for chunk in split_every(chunk_size, self._get_risk_rate_partner_ids()):
+            ledger_model._notify_partners_modified(chunk)
+            self.flush()
 
     @api.model
     def _max_risk_date_due(self):
@@ -482,17 +976,8 @@ class ResPartner(models.Model):
     def _get_depends_compute_risk_exception(self):
         res = []
         for x in self._risk_field_list():
-            res.extend(
-                (
-                    x[0],
-                    x[1],
-                    x[2],
-                    "child_ids.%s" % x[0],
-                    "child_ids.%s" % x[1],
-                    "child_ids.%s" % x[2],
-                )
-            )
-        res.extend(("credit_limit", "child_ids.credit_limit"))
+            res.extend((x[0], x[1], x[2]))
+        res.append("credit_limit")
         return res
 
     def open_risk_pivot_info(self):
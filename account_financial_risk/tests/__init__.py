@@ -1 +1,2 @@
 from . import test_account_financial_risk
+from . import test_benchmark
@@ -0,0 +1,248 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import fields
+from odoo.tests.common import SavepointCase
+
+_logger = logging.getLogger(__name__)
+
+
+class RiskBenchmarkCase(SavepointCase):
+    """Base class of the financial risk benchmarks.
+
+    Data volumes are set with the environment variables
+    RISK_BENCHMARK_PARTNERS and RISK_BENCHMARK_LINES (receivable lines by
+    partner). Results are logged as JSON and also appended as a JSON line to
+    the file set in RISK_BENCHMARK_OUTPUT, if any.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.benchmark_partner_count = int(
+            os.environ.get("RISK_BENCHMARK_PARTNERS", 200)
+        )
+        cls.benchmark_line_count = int(os.environ.get("RISK_BENCHMARK_LINES", 5))
+        cls.benchmark_results = []
+        cls.company = cls.env.company
+        cls.benchmark_currency = cls.env.ref("base.EUR")
+        if cls.benchmark_currency == cls.company.currency_id:
+            cls.benchmark_currency = cls.env.ref("base.USD")
+        cls.benchmark_currency.active = True
+        cls.env["res.currency.rate"].create(
+            {
+                "currency_id": cls.benchmark_currency.id,
+                "name": fields.Date.today() - relativedelta(days=90),
+                "rate": 1.25,
+                "company_id": cls.company.id,
+            }
+        )
+        cls.benchmark_account_receivable = cls.env["account.account"].create(
+            {
+                "name": "Benchmark Receivable",
+                "code": "BENCH430",
+                "user_type_id": cls.env.ref("account.data_account_type_receivable").id,
+                "reconcile": True,
+            }
+        )
+        cls.benchmark_account_income = cls.env["account.account"].create(
+            {
+                "name": "Benchmark Income",
+                "code": "BENCH700",
+                "user_type_id": cls.env.ref("account.data_account_type_revenue").id,
+            }
+        )
+        cls.benchmark_journal = cls.env["account.journal"].create(
+            {"name": "Benchmark Journal", "code": "BENCH", "type": "general"}
+        )
+        cls.benchmark_partners = cls._create_benchmark_partners(
+            cls.benchmark_partner_count
+        )
+        cls.benchmark_moves = cls._create_benchmark_moves(
+            cls.benchmark_partners, cls.benchmark_line_count
+        )
+        cls.benchmark_payments = cls._reconcile_benchmark_moves(cls.benchmark_moves)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._emit_benchmark_results()
+        super().tearDownClass()
+
+    @classmethod
+    def _create_benchmark_partners(cls, count):
+        return cls.env["res.partner"].create(
+            [
+                {
+                    "name": "Benchmark partner %s" % index,
+                    "customer_rank": 1,
+                    "property_account_receivable_id": (
+                        cls.benchmark_account_receivable.id
+                    ),
+                    "risk_invoice_draft_include": True,
+                    "risk_invoice_open_include": True,
+                    "risk_invoice_unpaid_include": True,
+                    # Some partners in risk exception
+                    "credit_limit": 0.0 if index % 10 else 100.0,
+                }
+                for index in range(count)
+            ]
+        )
+
+    @classmethod
+    def _prepare_benchmark_move_vals(cls, partner, index):
+        """Entry with a receivable line maturing in the last 60 days, in the
+        company currency or in a foreign one.
+        """
+        amount = 100.0 + index
+        if index % 2:
+            currency = cls.benchmark_currency
+            amount_currency = amount * 1.25
+        else:
+            currency = cls.company.currency_id
+            amount_currency = amount
+        return {
+            "move_type": "entry",
+            "journal_id": cls.benchmark_journal.id,
+            "date": fields.Date.today() - relativedelta(days=index % 60),
+            "line_ids": [
+                (
+                    0,
+                    0,
+                    {
+                        "name": "Benchmark receivable",
+                        "partner_id": partner.id,
+                        "account_id": cls.benchmark_account_receivable.id,
+                        "debit": amount,
+                        "currency_id": currency.id,
+                        "amount_currency": amount_currency,
+                        "date_maturity": (
+                            fields.Date.today() - relativedelta(days=index % 60)
+                        ),
+                    },
+                ),
+                (
+                    0,
+                    0,
+                    {
+                        "name": "Benchmark income",
+                        "partner_id": partner.id,
+                        "account_id": cls.benchmark_account_income.id,
+                        "credit": amount,
+                        "currency_id": currency.id,
+                        "amount_currency": -amount_currency,
+                    },
+                ),
+            ],
+        }
+
+    @classmethod
+    def _create_benchmark_moves(cls, partners, lines_by_partner):
+        moves = cls.env["account.move"].create(
+            [
+                cls._prepare_benchmark_move_vals(partner, index)
+                for partner in partners
+                for index in range(lines_by_partner)
+            ]
+        )
+        moves.action_post()
+        return moves
+
+    @classmethod
+    def _reconcile_benchmark_moves(cls, moves):
+        """Partial payment of the first receivable line of every other
+        partner.
+        """
+        lines = moves.line_ids.filtered(
+            lambda x: x.account_id == cls.benchmark_account_receivable
+            and x.currency_id == cls.company.currency_id
+        )
+        lines_to_pay = cls.env["account.move.line"]
+        for partner in cls.benchmark_partners[::2]:
+            lines_to_pay |= lines.filtered(lambda x: x.partner_id == partner)[:1]
+        payments = cls.env["account.move"].create(
+            [
+                {
+                    "move_type": "entry",
+                    "journal_id": cls.benchmark_journal.id,
+                    "line_ids": [
+                        (
+                            0,
+                            0,
+                            {
+                                "name": "Benchmark payment",
+                                "partner_id": line.partner_id.id,
+                                "account_id": line.account_id.id,
+                                "credit": line.debit / 2,
+                            },
+                        ),
+                        (
+                            0,
+                            0,
+                            {
+                                "name": "Benchmark payment",
+                                "partner_id": line.partner_id.id,
+                                "account_id": cls.benchmark_account_income.id,
+                                "debit": line.debit / 2,
+                            },
+                        ),
+                    ],
+                }
+                for line in lines_to_pay
+            ]
+        )
+        payments.action_post()
+        for line, payment in zip(lines_to_pay, payments):
+            payment_line = payment.line_ids.filtered(
+                lambda x: x.account_id == cls.benchmark_account_receivable
+            )
+            (line | payment_line).reconcile()
+        return payments
+
+    @contextmanager
+    def benchmark(self, name, count):
+        """Time the block and count its queries, including the pending
+        recomputations.
+        """
+        self.env["base"].flush()
+        queries = self.cr.sql_log_count
+        start = time.perf_counter()
+        yield
+        self.env["base"].flush()
+        elapsed = time.perf_counter() - start
+        self.benchmark_results.append(
+            {
+                "name": name,
+                "count": count,
+                "seconds": round(elapsed, 6),
+                "queries": self.cr.sql_log_count - queries,
+                "ms_per_record": count and round(1000 * elapsed / count, 3),
+            }
+        )
+
+    @classmethod
+    def _emit_benchmark_results(cls):
+        report = json.dumps(
+            {
+                "module": cls.__module__.split(".")[2],
+                "benchmark": cls.__name__,
+                "date": fields.Datetime.to_string(fields.Datetime.now()),
+                "partners": cls.benchmark_partner_count,
+                "lines_by_partner": cls.benchmark_line_count,
+                "results": cls.benchmark_results,
+            },
+            sort_keys=True,
+        )
+        _logger.info("Financial risk benchmark: %s", report)
+        output = os.environ.get("RISK_BENCHMARK_OUTPUT")
+        if output:
+            with open(output, "a") as output_file:
+                output_file.write(report + "\n")
@@ -1,10 +1,12 @@
 # Copyright 2016-2019 Tecnativa - Carlos Dauden
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
+from unittest.mock import patch
+
 from dateutil.relativedelta import relativedelta
 
 from odoo import fields
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
 from odoo.tests.common import SavepointCase
 
 
@@ -199,6 +201,7 @@ class TestPartnerFinancialRisk(SavepointCase):
         self.assertAlmostEqual(self.partner.risk_account_amount, 0.0)
         self.assertAlmostEqual(self.partner.risk_account_amount_unpaid, 100.0)
         line.company_id.invoice_unpaid_margin = 3
+        self.env["partner.risk.recompute.job"]._process_jobs()
         self.assertAlmostEqual(self.partner.risk_account_amount, 100.0)
         self.assertAlmostEqual(self.partner.risk_account_amount_unpaid, 0.0)
         # Test pop vals write
@@ -287,3 +290,607 @@ class TestPartnerFinancialRisk(SavepointCase):
             self.partner.risk_amount_exceeded,
             self.partner.risk_total - self.partner.credit_limit,
         )
+
+    def test_risk_ledger(self):
+        ledger_model = self.env["partner.risk.ledger"]
+        ledger_model._process_pending()
+        ledger = ledger_model.search([("partner_id", "=", self.partner.id)])
+        self.assertEqual(ledger.bucket, "draft")
+        self.assertAlmostEqual(ledger.amount_residual, 550.0)
+        self.invoice.action_post()
+        ledger_model._process_pending()
+        ledger = ledger_model.search([("partner_id", "=", self.partner.id)])
+        self.assertEqual(ledger.bucket, "open")
+        self.assertEqual(ledger.account_id, self.account_customer)
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 550.0)
+        self.invoice.button_draft()
+        self.invoice.button_cancel()
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 0.0)
+        self.assertFalse(ledger_model.search([("partner_id", "=", self.partner.id)]))
+
+    def test_risk_ledger_rebuild(self):
+        self.invoice.action_post()
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 550.0)
+        ledger_model = self.env["partner.risk.ledger"]
+        ledger_model.search([("partner_id", "=", self.partner.id)]).unlink()
+        ledger_model._rebuild()
+        self.partner.invalidate_cache()
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 550.0)
+
+    def test_search_risk_exception_stored(self):
+        self.partner.risk_invoice_draft_include = True
+        self.partner.credit_limit = 100.0
+        partners = self.env["res.partner"].search([("risk_exception", "=", True)])
+        self.assertIn(self.partner, partners)
+        self.assertAlmostEqual(self.partner.risk_total, 550.0)
+        self.assertAlmostEqual(self.partner.risk_amount_exceeded, 450.0)
+        self.invoice.button_cancel()
+        partners = self.env["res.partner"].search([("risk_exception", "=", True)])
+        self.assertNotIn(self.partner, partners)
+        self.assertAlmostEqual(self.partner.risk_total, 0.0)
+
+    def test_risk_ledger_single_scan(self):
+        invoice2 = self.invoice.copy()
+        invoice2.action_post()
+        invoice2.line_ids.filtered(lambda x: x.debit).date_maturity = "2017-01-01"
+        ledger_model = self.env["partner.risk.ledger"]
+        companies = self.env.company
+        rows = ledger_model._compute_ledger_rows(self.partner.ids, companies)
+        rows_read_group = ledger_model._compute_ledger_rows_read_group(
+            self.partner.ids, ledger_model._get_ledger_groups(companies)
+        )
+        self.assertEqual(sorted(rows), sorted(rows_read_group))
+        self.assertEqual({row[3] for row in rows}, {"draft", "unpaid"})
+
+    def test_risk_account_amount_partner_batch(self):
+        partner2 = self.env["res.partner"].create(
+            {
+                "name": "Partner test 2",
+                "customer_rank": 1,
+                "property_account_receivable_id": self.account_customer.id,
+            }
+        )
+        self.invoice.copy({"partner_id": partner2.id}).action_post()
+        partners = self.partner | partner2
+        partners.invalidate_cache()
+        partners._compute_risk_account_amount()
+        self.assertAlmostEqual(self.partner.risk_invoice_draft, 550.0)
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 0.0)
+        self.assertAlmostEqual(partner2.risk_invoice_draft, 0.0)
+        self.assertAlmostEqual(partner2.risk_invoice_open, 550.0)
+        # Receivable accounts are prefetched by company for the whole batch
+        partners.invalidate_cache()
+        partners._get_risk_partner_groups()
+        with self.assertQueryCount(0):
+            for partner in partners:
+                partner.with_company(self.env.company).property_account_receivable_id
+
+    def test_risk_rate_cache(self):
+        usd = self.env.ref("base.USD")
+        eur = self.env.ref("base.EUR")
+        company = self.env.company
+        today = fields.Date.today()
+        self.env["res.currency.rate"].create(
+            {"currency_id": eur.id, "name": today, "rate": 2.0}
+        )
+        self.assertAlmostEqual(eur._risk_convert(100.0, usd, company, today), 50.0)
+        self.assertAlmostEqual(
+            eur._risk_convert(100.0, usd, company, today),
+            eur._convert(100.0, usd, company, today, round=False),
+        )
+        eur.rate_ids.filtered(lambda x: x.name == today).rate = 4.0
+        self.assertAlmostEqual(eur._risk_convert(100.0, usd, company, today), 25.0)
+        self.assertAlmostEqual(usd._risk_convert(100.0, usd, company, today), 100.0)
+
+    def test_risk_ledger_rollover(self):
+        self.env.company.invoice_unpaid_margin = 3
+        self.env["partner.risk.recompute.job"]._process_jobs()
+        self.invoice.action_post()
+        line = self.invoice.line_ids.filtered(lambda x: x.debit != 0.0)
+        line.date_maturity = fields.Date.today() - relativedelta(days=2)
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 550.0)
+        ledger_model = self.env["partner.risk.ledger"]
+        # Change the margin without the ORM, as if days had passed
+        self.env.cr.execute(
+            "UPDATE res_company SET invoice_unpaid_margin = 1 WHERE id = %s",
+            (self.env.company.id,),
+        )
+        self.env.company.invalidate_cache()
+        self.partner.invalidate_cache()
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 550.0)
+        ledger_model._cron_rollover()
+        # The rollover only schedules the partners with lines in the range
+        job = self.env["partner.risk.recompute.job"].search(
+            [("company_id", "=", self.env.company.id), ("state", "=", "pending")]
+        )
+        self.assertEqual(job.date_from, fields.Date.today() - relativedelta(days=3))
+        self.assertEqual(job.date_to, fields.Date.today() - relativedelta(days=1))
+        self.assertEqual(job.total, 1)
+        self.assertEqual(job._next_partner_ids(10), self.partner.ids)
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 550.0)
+        self.env["partner.risk.recompute.job"]._process_jobs()
+        self.assertEqual(job.state, "done")
+        self.assertEqual(
+            self.env.company.risk_ledger_max_date,
+            fields.Date.today() - relativedelta(days=1),
+        )
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 0.0)
+        self.assertAlmostEqual(self.partner.risk_invoice_unpaid, 550.0)
+
+    def test_recompute_job_resume(self):
+        self.invoice.action_post()
+        line = self.invoice.line_ids.filtered(lambda x: x.debit != 0.0)
+        line.date_maturity = fields.Date.today() - relativedelta(days=2)
+        self.assertAlmostEqual(self.partner.risk_invoice_unpaid, 550.0)
+        self.env.company.risk_ledger_max_date = fields.Date.today()
+        self.env.company.invoice_unpaid_margin = 3
+        job = self.env["partner.risk.recompute.job"].search(
+            [("company_id", "=", self.env.company.id), ("state", "=", "pending")]
+        )
+        self.assertEqual(job.total, 1)
+        # Job interrupted after a committed chunk of partners with lower ids
+        job.write(
+            {
+                "state": "in_progress",
+                "last_partner_id": self.partner.id - 1,
+                "date_start": fields.Datetime.now(),
+            }
+        )
+        self.env["partner.risk.recompute.job"]._process_jobs()
+        self.assertEqual(job.state, "done")
+        self.assertEqual(job.done_count, 1)
+        self.assertEqual(job.progress, 100.0)
+        self.assertEqual(
+            self.env.company.risk_ledger_max_date,
+            fields.Date.today() - relativedelta(days=3),
+        )
+        self.assertAlmostEqual(self.partner.risk_invoice_unpaid, 0.0)
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 550.0)
+
+    def test_risk_snapshot(self):
+        self.partner.risk_invoice_draft_include = True
+        snapshot_model = self.env["partner.risk.snapshot"]
+        snapshot_model._take_snapshot()
+        domain = [
+            ("partner_id", "=", self.partner.id),
+            ("date", "=", fields.Date.context_today(snapshot_model)),
+        ]
+        snapshots = snapshot_model.search(domain)
+        draft = snapshots.filtered(lambda x: x.risk_field == "risk_invoice_draft")
+        self.assertAlmostEqual(draft.amount, 550.0)
+        # Zero values are stored too, so the averages count every day
+        open_snapshot = snapshots.filtered(
+            lambda x: x.risk_field == "risk_invoice_open"
+        )
+        self.assertEqual(open_snapshot.amount, 0.0)
+        # Taking it again the same day replaces the values
+        self.invoice.action_post()
+        snapshot_model._take_snapshot()
+        snapshots = snapshot_model.search(domain)
+        draft = snapshots.filtered(lambda x: x.risk_field == "risk_invoice_draft")
+        self.assertEqual(draft.amount, 0.0)
+        open_snapshot = snapshots.filtered(
+            lambda x: x.risk_field == "risk_invoice_open"
+        )
+        self.assertAlmostEqual(open_snapshot.amount, 550.0)
+        # Daily balances of several days are added up and averaged
+        snapshot_model._take_snapshot(
+            date=fields.Date.context_today(snapshot_model) - relativedelta(days=2)
+        )
+        self.invoice.button_draft()
+        snapshot_model._take_snapshot(
+            date=fields.Date.context_today(snapshot_model) - relativedelta(days=1)
+        )
+        res = snapshot_model.read_group(
+            [
+                ("partner_id", "=", self.partner.id),
+                ("risk_field", "=", "risk_invoice_open"),
+            ],
+            ["amount", "average_amount"],
+            ["risk_field"],
+        )
+        self.assertAlmostEqual(res[0]["amount"], 1100.0)
+        self.assertAlmostEqual(res[0]["average_amount"], 1100.0 / 3)
+
+    def test_filter_risk_exception(self):
+        partners = self.invoice_address | self.partner
+        self.assertFalse(partners._filter_risk_exception())
+        self.partner.risk_invoice_draft_include = True
+        self.partner.credit_limit = 100.0
+        self.assertEqual(partners._filter_risk_exception(), self.partner)
+        # Changes in the amounts of the lines refresh the verdict
+        self.invoice.button_cancel()
+        self.assertFalse(partners._filter_risk_exception())
+        # Lines moved to another partner refresh both verdicts
+        self.invoice.button_draft()
+        partner2 = self.env["res.partner"].create(
+            {
+                "name": "Partner test 2",
+                "property_account_receivable_id": self.account_customer.id,
+            }
+        )
+        self.assertEqual(partners._filter_risk_exception(), self.partner)
+        self.invoice.line_ids.write({"partner_id": partner2.id})
+        self.assertFalse(partners._filter_risk_exception())
+        self.assertAlmostEqual(partner2.risk_invoice_draft, 550.0)
+
+    def test_risk_group(self):
+        self.partner.write({"is_company": True, "risk_invoice_draft_include": True})
+        head = self.env["res.partner"].create(
+            {"name": "Head office", "is_company": True}
+        )
+        self.partner.parent_id = head
+        self.assertAlmostEqual(head.risk_group_total, 550.0)
+        self.assertAlmostEqual(self.partner.risk_group_total, 550.0)
+        self.assertFalse(head.risk_group_exception)
+        head.risk_group_credit_limit = 500.0
+        self.assertTrue(head.risk_group_exception)
+        self.assertFalse(self.partner.risk_exception)
+        self.assertEqual(self.invoice_address._filter_risk_exception(), self.partner)
+        # Changes in a descendant only refresh its ancestors
+        self.invoice.button_cancel()
+        self.assertAlmostEqual(head.risk_group_total, 0.0)
+        self.assertFalse(head.risk_group_exception)
+        self.invoice.button_draft()
+        self.assertTrue(head.risk_group_exception)
+        # Moving the partner out of the group
+        self.partner.parent_id = False
+        self.assertAlmostEqual(head.risk_group_total, 0.0)
+        self.assertFalse(self.partner._filter_risk_exception())
+        closure = self.env["partner.risk.closure"]
+        self.assertFalse(
+            closure.search(
+                [
+                    ("ancestor_id", "=", head.id),
+                    ("descendant_id", "=", self.invoice_address.id),
+                ]
+            )
+        )
+        # The rebuild gives the same rows than the incremental updates
+        self.partner.parent_id = head
+        domain = [("descendant_id", "in", (head | self.partner).child_ids.ids)]
+        rows = closure.search(domain).mapped(
+            lambda x: (x.ancestor_id.id, x.descendant_id.id, x.depth)
+        )
+        self.assertIn((head.id, self.invoice_address.id, 2), rows)
+        closure._rebuild()
+        self.assertEqual(
+            sorted(rows),
+            sorted(
+                closure.search(domain).mapped(
+                    lambda x: (x.ancestor_id.id, x.descendant_id.id, x.depth)
+                )
+            ),
+        )
+
+    def test_risk_group_partner_merge(self):
+        self.partner.write({"is_company": True, "risk_invoice_draft_include": True})
+        old_head = self.env["res.partner"].create(
+            {"name": "Old head office", "is_company": True}
+        )
+        head = self.env["res.partner"].create(
+            {
+                "name": "Head office",
+                "is_company": True,
+                "risk_group_credit_limit": 500.0,
+            }
+        )
+        self.partner.parent_id = old_head
+        self.assertFalse(self.invoice_address._filter_risk_exception())
+        # Children are moved to the destination partner with SQL
+        self.env["base.partner.merge.automatic.wizard"]._merge(
+            (old_head | head).ids, head, extra_checks=False
+        )
+        self.assertEqual(self.partner.parent_id, head)
+        closure = self.env["partner.risk.closure"]
+        rows = closure.search([("descendant_id", "=", self.invoice_address.id)]).mapped(
+            lambda x: (x.ancestor_id.id, x.depth)
+        )
+        self.assertEqual(
+            sorted(rows),
+            sorted([(self.invoice_address.id, 0), (self.partner.id, 1), (head.id, 2)]),
+        )
+        self.assertAlmostEqual(head.risk_group_total, 550.0)
+        self.assertEqual(self.invoice_address._filter_risk_exception(), self.partner)
+
+    def test_risk_company_breakdown(self):
+        self.invoice.action_post()
+        breakdown = self.partner.get_risk_company_breakdown()
+        company_vals = breakdown[self.partner.id][self.env.company.id]
+        self.assertAlmostEqual(company_vals["risk_invoice_open"], 550.0)
+        self.assertAlmostEqual(
+            sum(
+                amount
+                for vals in breakdown[self.partner.id].values()
+                for amount in vals.values()
+            ),
+            self.partner.risk_invoice_open,
+        )
+        action = self.invoice_address.open_risk_company_breakdown()
+        self.assertEqual(action["res_model"], "partner.risk.ledger")
+        self.assertIn(("partner_id", "=", self.partner.id), action["domain"])
+
+    def test_risk_exception_columns(self):
+        partner2 = self.env["res.partner"].create(
+            {
+                "name": "Partner test 2",
+                "property_account_receivable_id": self.account_customer.id,
+                "risk_invoice_open_include": True,
+                "credit_limit": 100.0,
+            }
+        )
+        self.invoice.action_post()
+        self.partner.risk_invoice_open_limit = 500.0
+        partners = self.partner | partner2 | self.partner
+        totals, amounts_exceeded, exceptions = partners._get_risk_exception_columns()
+        self.assertEqual(totals, [0.0, 0.0, 0.0])
+        self.assertEqual(amounts_exceeded, [50.0, 0.0, 50.0])
+        self.assertEqual(exceptions, [True, False, True])
+
+    def test_simulate_risk(self):
+        partner2 = self.env["res.partner"].create(
+            {
+                "name": "Partner test 2",
+                "property_account_receivable_id": self.account_customer.id,
+                "risk_invoice_open_include": True,
+                "credit_limit": 100.0,
+            }
+        )
+        partner_model = self.env["res.partner"]
+        res = partner_model.simulate_risk(
+            [
+                {"type": "invoice", "partner_id": partner2.id, "amount": 60.0},
+                {"type": "invoice", "partner_id": partner2.id, "amount": 60.0},
+                {
+                    "type": "invoice",
+                    "partner_id": partner2.id,
+                    "amount": 40.0,
+                    "currency_id": partner2.risk_currency_id.id,
+                    "ref": "INV3",
+                },
+                {"type": "invoice", "partner_id": partner2.id, "amount": 1.0},
+            ]
+        )
+        self.assertEqual([x["exception"] for x in res], [False, True, False, True])
+        self.assertEqual(
+            res[1]["exception_msg"], "This invoice exceeds the financial risk.\n"
+        )
+        self.assertEqual([x["headroom"] for x in res], [40.0, 40.0, 0.0, 0.0])
+        self.assertEqual(res[2]["ref"], "INV3")
+        # Nothing is written
+        self.assertEqual(partner2.risk_invoice_open, 0.0)
+        self.assertEqual(partner2.risk_total, 0.0)
+        # Accepted documents can set the partner in risk exception
+        partner2.write(
+            {
+                "risk_invoice_open_include": False,
+                "risk_invoice_open_limit": 50.0,
+                "credit_limit": 0.0,
+            }
+        )
+        res = partner_model.simulate_risk(
+            [
+                {"type": "invoice", "partner_id": partner2.id, "amount": 50.0},
+                {"type": "invoice", "partner_id": partner2.id, "amount": 10.0},
+            ]
+        )
+        self.assertFalse(res[0]["exception"])
+        self.assertEqual(
+            res[1]["exception_msg"], "This invoice exceeds the open invoices risk.\n"
+        )
+        self.assertEqual(partner_model.simulate_risk([]), [])
+        with self.assertRaises(UserError):
+            partner_model.simulate_risk(
+                [{"type": "unknown", "partner_id": partner2.id, "amount": 1.0}]
+            )
+
+    def test_risk_reservation(self):
+        reservation_model = self.env["partner.risk.reservation"]
+        self.partner.risk_invoice_open_limit = 1000.0
+        invoice2 = self.invoice.copy()
+        # Invoice being posted by another user
+        self.assertEqual(invoice2._get_risk_exception_invoices(), [])
+        wiz_dic = self.invoice.action_post()
+        wiz = self.env[wiz_dic["res_model"]].browse(wiz_dic["res_id"])
+        self.assertEqual(
+            wiz.exception_msg, "This invoice exceeds the open invoices risk.\n"
+        )
+        invoice2.button_cancel()
+        self.assertFalse(
+            reservation_model.search(
+                [("res_model", "=", "account.move"), ("res_id", "=", invoice2.id)]
+            )
+        )
+        self.invoice.action_post()
+        self.assertEqual(self.invoice.state, "posted")
+        reservation = reservation_model.search(
+            [("res_model", "=", "account.move"), ("res_id", "=", self.invoice.id)]
+        )
+        self.assertEqual(reservation.state, "converted")
+        self.assertEqual(reservation.amount, 550.0)
+        # Posted invoices are already included in the partner risk
+        invoice3 = self.invoice.copy()
+        self.assertEqual(
+            reservation_model._simulate_and_reserve(
+                invoice3,
+                [{"type": "invoice", "partner_id": self.partner.id, "amount": 400.0}],
+            ),
+            [""],
+        )
+
+    def _read_committed_reservations(self, document):
+        with self.registry.cursor() as cr:
+            cr.execute(
+                """
+                SELECT state
+                FROM partner_risk_reservation
+                WHERE res_model = %s AND res_id = %s
+                """,
+                (document._name, document.id),
+            )
+            return [row[0] for row in cr.fetchall()]
+
+    def test_risk_reservation_own_cursor(self):
+        # Partner committed in the database, as the reservations are
+        partner = self.env.ref("base.partner_admin")
+        partner.risk_invoice_open_limit = 1000.0
+        reservation_model = self.env["partner.risk.reservation"]
+        with patch.object(
+            type(reservation_model),
+            "_use_reservation_main_cursor",
+            lambda self: False,
+        ):
+            try:
+                self.assertEqual(
+                    reservation_model._simulate_and_reserve(
+                        self.invoice,
+                        [
+                            {
+                                "type": "invoice",
+                                "partner_id": partner.id,
+                                "amount": 550.0,
+                            }
+                        ],
+                    ),
+                    [""],
+                )
+                # Committed apart, so the other transactions see it at once
+                self.assertEqual(
+                    self._read_committed_reservations(self.invoice), ["reserved"]
+                )
+                reservation_model._convert(self.invoice)
+                self.assertEqual(
+                    self._read_committed_reservations(self.invoice), ["converted"]
+                )
+            finally:
+                reservation_model._release(self.invoice)
+            self.assertEqual(self._read_committed_reservations(self.invoice), [])
+
+    def test_post_risk_checked_once(self):
+        self.partner.risk_invoice_open_limit = 1000.0
+        reservation_class = type(self.env["partner.risk.reservation"])
+        simulate_and_reserve = reservation_class._simulate_and_reserve
+        with patch.object(
+            reservation_class,
+            "_simulate_and_reserve",
+            autospec=True,
+            side_effect=simulate_and_reserve,
+        ) as mock:
+            self.invoice.action_post()
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual(self.invoice.state, "posted")
+
+    def test_defer_risk_recompute(self):
+        self.assertAlmostEqual(self.partner.risk_invoice_draft, 550.0)
+        self.invoice.with_context(defer_risk_recompute=True).action_post()
+        self.invoice.line_ids.with_context(defer_risk_recompute=True).write(
+            {"date_maturity": fields.Date.today()}
+        )
+        # Done at commit time
+        self.env["partner.risk.ledger"]._enqueue_deferred()
+        queue_model = self.env["partner.risk.ledger.queue"]
+        queue = queue_model.search([("partner_id", "=", self.partner.id)])
+        self.assertEqual(len(queue), 1)
+        # Risk is refreshed by the follow-up job
+        self.assertAlmostEqual(self.partner.risk_invoice_draft, 550.0)
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 0.0)
+        queue_model._process_queue()
+        self.assertFalse(queue.exists())
+        self.assertAlmostEqual(self.partner.risk_invoice_draft, 0.0)
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 550.0)
+
+    def test_risk_exception_invoices_batch(self):
+        self.partner.risk_invoice_open_limit = 1000.0
+        partner2 = self.env["res.partner"].create(
+            {
+                "name": "Partner test 2",
+                "property_account_receivable_id": self.account_customer.id,
+            }
+        )
+        invoice2 = self.invoice.copy({"partner_id": self.invoice_address.id})
+        invoice3 = self.invoice.copy({"partner_id": partner2.id})
+        invoice4 = self.invoice.copy()
+        invoice4.write(
+            {"invoice_line_ids": [(1, invoice4.invoice_line_ids.id, {"quantity": 1})]}
+        )
+        invoices = self.invoice | invoice2 | invoice3 | invoice4
+        # Invoices of the same partner are accumulated in posting order
+        blocked = invoices._get_risk_exception_invoices()
+        self.assertEqual([x[0] for x in blocked], [invoice2])
+        self.assertEqual(
+            blocked[0][1], "This invoice exceeds the open invoices risk.\n"
+        )
+        # Only accepted invoices of partners with limits are reserved
+        reservations = self.env["partner.risk.reservation"].search(
+            [("res_model", "=", "account.move"), ("res_id", "in", invoices.ids)]
+        )
+        self.assertEqual(
+            sorted(reservations.mapped("res_id")), sorted((self.invoice | invoice4).ids)
+        )
+        self.assertEqual(invoices._first_invoice_exception_msg()[0], invoice2)
+        res = (
+            self.env["validate.account.move"]
+            .with_context(active_model="account.move", active_ids=invoices.ids)
+            .create({})
+            .validate_move()
+        )
+        wiz = self.env[res["res_model"]].browse(res["res_id"])
+        self.assertEqual(wiz.origin_res_ids, str(invoice2.id))
+        self.assertIn(invoice2.display_name, wiz.exception_msg)
+        self.assertEqual(invoice2.state, "draft")
+        self.assertEqual(
+            (self.invoice | invoice3 | invoice4).mapped("state"), ["posted"] * 3
+        )
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 605.0)
+
+    def test_risk_amount_total_currency_stored(self):
+        invoice2 = self.invoice.copy()
+        invoices = self.env["account.move"].search(
+            [
+                ("partner_id", "=", self.partner.id),
+                ("risk_amount_total_currency", "=", 550.0),
+            ]
+        )
+        self.assertEqual(invoices, self.invoice | invoice2)
+        self.env["res.currency.rate"].create(
+            {
+                "currency_id": self.env.ref("base.EUR").id,
+                "name": self.invoice.date,
+                "rate": 2.0,
+            }
+        )
+        self.partner.write(
+            {
+                "credit_currency": "manual",
+                "manual_credit_currency_id": self.env.ref("base.EUR").id,
+            }
+        )
+        self.assertEqual(invoice2.risk_currency_id, self.env.ref("base.EUR"))
+        self.assertAlmostEqual(invoice2.risk_amount_total_currency, 1100.0)
+        self.assertAlmostEqual(self.invoice.risk_amount_total_currency, 1100.0)
+        # Invoices of contacts use the currency of the commercial partner
+        invoice3 = self.invoice.copy({"partner_id": self.invoice_address.id})
+        self.assertEqual(invoice3.risk_currency_id, self.env.ref("base.EUR"))
+        self.assertAlmostEqual(invoice3.risk_amount_total_currency, 1100.0)
+        # Changing the pricelist of the partner updates the stored amounts
+        self.partner.write(
+            {"credit_currency": "pricelist", "manual_credit_currency_id": False}
+        )
+        self.assertAlmostEqual(invoice2.risk_amount_total_currency, 550.0)
+        self.partner.property_product_pricelist = self.env["product.pricelist"].create(
+            {"name": "EUR pricelist", "currency_id": self.env.ref("base.EUR").id}
+        )
+        self.assertAlmostEqual(invoice2.risk_amount_total_currency, 1100.0)
+
+    def test_risk_exception_fixed_context(self):
+        self.invoice._post()
+        other_company = self.env["res.company"].create({"name": "Other company"})
+        partner = self.partner.sudo().with_context(
+            allowed_company_ids=other_company.ids
+        )
+        partner.write({"risk_invoice_open_include": True, "credit_limit": 100.0})
+        # Risk amounts depend on the allowed companies, the stored verdict not
+        self.assertAlmostEqual(partner.risk_invoice_open, 0.0)
+        self.assertAlmostEqual(partner.risk_total, 550.0)
+        self.assertTrue(partner.risk_exception)
+        self.assertAlmostEqual(self.partner.risk_invoice_open, 550.0)
@@ -0,0 +1,43 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo.tests import tagged
+
+from .benchmark_common import RiskBenchmarkCase
+
+
+@tagged("-standard", "risk_benchmark")
+class TestAccountFinancialRiskBenchmark(RiskBenchmarkCase):
+    def test_benchmark_risk_ledger(self):
+        partners = self.benchmark_partners
+        ledger_model = self.env["partner.risk.ledger"]
+        with self.benchmark("partner.risk.ledger._refresh_partners", len(partners)):
+            ledger_model._refresh_partners(partners.ids)
+        with self.benchmark("partner.risk.ledger._rebuild", len(partners)):
+            ledger_model._rebuild(companies=self.company)
+
+    def test_benchmark_risk_account_amount(self):
+        partners = self.benchmark_partners
+        partners.invalidate_cache()
+        with self.benchmark("res.partner._compute_risk_account_amount", len(partners)):
+            partners._compute_risk_account_amount()
+        self.assertTrue(any(partners.mapped("risk_invoice_unpaid")))
+
+    def test_benchmark_risk_exception(self):
+        partners = self.benchmark_partners
+        partners.invalidate_cache()
+        with self.benchmark("res.partner._compute_risk_exception", len(partners)):
+            partners._compute_risk_exception()
+        # Recompute triggered by a change in the receivable lines
+        lines = self.benchmark_moves.line_ids.filtered(
+            lambda x: x.account_id == self.benchmark_account_receivable
+        )
+        with self.benchmark("account.move.line.write(date_maturity)", len(lines)):
+            lines.write({"date_maturity": lines[:1].date_maturity})
+            partners.mapped("risk_exception")
+
+    def test_benchmark_search_risk_exception(self):
+        partner_model = self.env["res.partner"]
+        with self.benchmark("res.partner.search(risk_exception)", 1):
+            partners = partner_model.search([("risk_exception", "=", True)])
+        self.assertTrue(partners & self.benchmark_partners)
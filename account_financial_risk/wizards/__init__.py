@@ -1 +1,3 @@
+from . import account_validate_account_move
+from . import base_partner_merge
 from . import parner_risk_exceeded
@@ -0,0 +1,64 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import models
+
+
+class ValidateAccountMove(models.TransientModel):
+    _inherit = "validate.account.move"
+
+    def _get_risk_moves(self):
+        """Draft moves to post, as selected by validate_move"""
+        if self.env.context.get("active_model") == "account.move":
+            domain = [("id", "in", self.env.context.get("active_ids", []))]
+        elif self.env.context.get("active_model") == "account.journal":
+            domain = [("journal_id", "=", self.env.context.get("active_id"))]
+        else:
+            return self.env["account.move"]
+        return (
+            self.env["account.move"]
+            .search(domain + [("state", "=", "draft")])
+            .filtered("line_ids")
+        )
+
+    def validate_move(self):
+        """Check the risk of all the invoices at once, post the ones that
+        don't exceed it and show a summary of the blocked ones.
+        """
+        if self.env.context.get("bypass_risk"):
+            return super().validate_move()
+        moves = self._get_risk_moves()
+        blocked = moves._get_risk_exception_invoices()
+        if not blocked:
+            return super(
+                ValidateAccountMove, self.with_context(bypass_risk=True)
+            ).validate_move()
+        blocked_moves = moves.browse([invoice.id for invoice, _msg in blocked])
+        if moves - blocked_moves:
+            super(
+                ValidateAccountMove,
+                self.with_context(
+                    active_model="account.move",
+                    active_ids=(moves - blocked_moves).ids,
+                    bypass_risk=True,
+                ),
+            ).validate_move()
+        first_invoice = blocked_moves[:1]
+        return (
+            self.env["partner.risk.exceeded.wiz"]
+            .create(
+                {
+                    "exception_msg": "".join(
+                        "{}: {}".format(invoice.display_name, msg)
+                        for invoice, msg in blocked
+                    ),
+                    "partner_id": first_invoice.partner_id.commercial_partner_id.id,
+                    "origin_reference": "{},{}".format(
+                        "account.move", first_invoice.id
+                    ),
+                    "origin_res_ids": ",".join(str(x) for x in blocked_moves.ids),
+                    "continue_method": "action_post",
+                }
+            )
+            .action_show()
+        )
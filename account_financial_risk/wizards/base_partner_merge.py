@@ -0,0 +1,22 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import models
+
+
+class MergePartnerAutomatic(models.TransientModel):
+    _inherit = "base.partner.merge.automatic.wizard"
+
+    def _merge(self, partner_ids, dst_partner=None, extra_checks=True):
+        partners = self.env["res.partner"].browse(partner_ids)
+        res = super()._merge(
+            partner_ids, dst_partner=dst_partner, extra_checks=extra_checks
+        )
+        # Children of the merged partners are moved to the destination
+        # partner with SQL, deleting the closure rows in conflict
+        partners = partners.exists()
+        self.env["partner.risk.closure"]._rebuild_subtrees(partners)
+        self.env["res.partner"].invalidate_cache(
+            ["risk_group_total", "risk_group_exception"]
+        )
+        return res
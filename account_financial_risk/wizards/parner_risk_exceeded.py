@@ -17,6 +17,10 @@ class PartnerRiskExceededWiz(models.TransientModel):
         string="Object",
     )
     continue_method = fields.Char()
+    origin_res_ids = fields.Char(
+        help="Comma separated ids of all the documents to continue with, of the "
+        "same model than the object. Empty to continue only with the object."
+    )
 
     def action_show(self):
         self.ensure_one()
@@ -31,6 +35,9 @@ class PartnerRiskExceededWiz(models.TransientModel):
 
     def button_continue(self):
         self.ensure_one()
-        return getattr(
-            self.origin_reference.with_context(bypass_risk=True), self.continue_method
-        )()
+        records = self.origin_reference
+        if self.origin_res_ids:
+            records = records.browse(
+                [int(res_id) for res_id in self.origin_res_ids.split(",")]
+            )
+        return getattr(records.with_context(bypass_risk=True), self.continue_method)()
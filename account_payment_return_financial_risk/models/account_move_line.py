@@ -0,0 +1,14 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import api, models
+
+
+class AccountMoveLine(models.Model):
+    _inherit = "account.move.line"
+
+    @api.model
+    def _risk_ledger_fields(self):
+        res = super()._risk_ledger_fields()
+        res.add("partial_reconcile_returned_ids")
+        return res
@@ -23,7 +23,8 @@ class ResPartner(models.Model):
         "lines related.",
     )
 
-    @api.depends("move_line_ids.partial_reconcile_returned_ids")
+    # Returns are notified by the partner risk ledger, as the returned lines
+    # are part of its tracked fields
     def _compute_risk_account_amount(self):
         self.update({"risk_payment_return": 0.0})
         super()._compute_risk_account_amount()
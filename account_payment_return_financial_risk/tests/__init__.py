@@ -1 +1,2 @@
 from . import test_payment_return_risk
+from . import test_benchmark
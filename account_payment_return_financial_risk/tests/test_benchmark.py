@@ -0,0 +1,50 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo.tests import tagged
+
+from odoo.addons.account_financial_risk.tests.benchmark_common import (
+    RiskBenchmarkCase,
+)
+
+
+@tagged("-standard", "risk_benchmark")
+class TestPaymentReturnRiskBenchmark(RiskBenchmarkCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        bank_journal = cls.env["account.journal"].create(
+            {"name": "Benchmark Bank Journal", "code": "BBANK", "type": "bank"}
+        )
+        payment_lines = cls.benchmark_payments.line_ids.filtered(
+            lambda x: x.account_id == cls.benchmark_account_receivable
+        )
+        cls.payment_return = cls.env["payment.return"].create(
+            {
+                "journal_id": bank_journal.id,
+                "line_ids": [
+                    (
+                        0,
+                        0,
+                        {
+                            "partner_id": line.partner_id.id,
+                            "move_line_ids": [(6, 0, line.ids)],
+                            "amount": line.credit,
+                        },
+                    )
+                    for line in payment_lines
+                ],
+            }
+        )
+        cls.returned_partners = payment_lines.partner_id
+
+    def test_benchmark_payment_return(self):
+        with self.benchmark(
+            "payment.return.action_confirm", len(self.payment_return.line_ids)
+        ):
+            self.payment_return.action_confirm()
+        partners = self.benchmark_partners
+        partners.invalidate_cache()
+        with self.benchmark("res.partner._compute_risk_account_amount", len(partners)):
+            partners._compute_risk_account_amount()
+        self.assertTrue(all(self.returned_partners.mapped("risk_payment_return")))
@@ -4,17 +4,20 @@
 {
     "name": "Sale Financial Risk",
     "summary": "Manage partner risk in sales orders",
-    "version": "14.0.1.3.1",
+    "version": "14.0.1.10.0",
     "category": "Sales Management",
     "license": "AGPL-3",
     "author": "Tecnativa, Odoo Community Association (OCA)",
     "website": "https://github.com/OCA/credit-control",
     "depends": ["sale", "account_financial_risk"],
     "data": [
+        "security/ir.model.access.csv",
+        "data/ir_cron.xml",
         "views/res_partner_view.xml",
         "views/sale_financial_risk_view.xml",
         "views/res_config_settings.xml",
     ],
     "installable": True,
     "pre_init_hook": "pre_init_hook",
+    "post_init_hook": "post_init_hook",
 }
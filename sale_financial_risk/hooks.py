@@ -3,10 +3,13 @@
 
 import logging
 
+from odoo import SUPERUSER_ID, api
 from odoo.tools import sql
 
 logger = logging.getLogger(__name__)
 
+RISK_AMOUNT_SQL_CHUNK = 100000
+
 
 def pre_init_hook(cr):
     """
@@ -14,6 +17,13 @@ def pre_init_hook(cr):
     of the module on an existing Odoo instance.
     """
     create_risk_partner_id_column(cr)
+    create_risk_amount_column(cr)
+
+
+def post_init_hook(cr, registry):
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    compute_missing_risk_amount(env)
+    env["partner.risk.sale.total"]._rebuild()
 
 
 def create_risk_partner_id_column(cr):
@@ -31,3 +41,66 @@ def create_risk_partner_id_column(cr):
             sol.risk_partner_id IS DISTINCT FROM p.commercial_partner_id;
         """
     )
+
+
+def create_risk_amount_column(cr):
+    """Create the risk_amount column of sale.order.line and set it to zero
+    with SQL, by chunks of ids, for the lines without risk: sections and
+    notes, lines of orders not confirmed and fully invoiced lines. Only the
+    remaining lines are left to the ORM.
+    """
+    if not sql.column_exists(cr, "sale_order_line", "risk_amount"):
+        sql.create_column(cr, "sale_order_line", "risk_amount", "numeric")
+    # Locked orders are included only after enabling it in the company
+    risk_states = ["sale"]
+    cr.execute("SELECT MIN(id), MAX(id) FROM sale_order_line")
+    min_id, max_id = cr.fetchone()
+    if min_id is None:
+        return
+    for start_id in range(min_id, max_id + 1, RISK_AMOUNT_SQL_CHUNK):
+        logger.info(
+            "Computing field risk_amount on sale.order.line: ids %s to %s of %s",
+            start_id,
+            start_id + RISK_AMOUNT_SQL_CHUNK - 1,
+            max_id,
+        )
+        cr.execute(
+            """
+            UPDATE sale_order_line sol
+            SET risk_amount = 0.0
+            WHERE sol.id >= %(start)s AND sol.id < %(end)s
+                AND sol.risk_amount IS NULL
+                AND (
+                    sol.display_type IS NOT NULL
+                    OR sol.state IS NULL
+                    OR sol.state NOT IN %(risk_states)s
+                    OR ABS(
+                        CASE
+                            WHEN (
+                                SELECT pt.invoice_policy
+                                FROM product_product pp
+                                JOIN product_template pt
+                                    ON pt.id = pp.product_tmpl_id
+                                WHERE pp.id = sol.product_id
+                            ) = 'delivery'
+                            THEN GREATEST(sol.product_uom_qty, sol.qty_delivered)
+                            ELSE sol.product_uom_qty
+                        END - sol.qty_invoiced
+                    ) < (
+                        SELECT uom.rounding / 2
+                        FROM uom_uom uom
+                        WHERE uom.id = sol.product_uom
+                    )
+                )
+            """,
+            {
+                "start": start_id,
+                "end": start_id + RISK_AMOUNT_SQL_CHUNK,
+                "risk_states": tuple(risk_states),
+            },
+        )
+
+
+def compute_missing_risk_amount(env):
+    """Compute with the ORM, by chunks, the lines not filled with SQL"""
+    env["sale.order.line"]._compute_missing_risk_amount()
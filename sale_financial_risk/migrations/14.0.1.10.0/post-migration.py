@@ -0,0 +1,17 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from openupgradelib import openupgrade
+
+
+@openupgrade.migrate()
+def migrate(env, version):
+    """Move the global setting of locked orders to every company"""
+    param = env["ir.config_parameter"].search(
+        [("key", "=", "sale_financial_risk.include_risk_sale_order_done")]
+    )
+    if not param:
+        return
+    if param.value:
+        env.cr.execute("UPDATE res_company SET include_risk_sale_order_done = TRUE")
+    param.unlink()
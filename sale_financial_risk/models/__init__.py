@@ -1,4 +1,6 @@
+from . import partner_risk_sale_total
 from . import payment
 from . import res_partner
 from . import sale
+from . import res_company
 from . import res_config_settings
@@ -0,0 +1,130 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import logging
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class PartnerRiskSaleTotal(models.Model):
+    """Running total of the sales order lines risk amount by commercial
+    partner and company.
+
+    Totals are updated by difference every time the risk amount, the
+    commercial partner or the company of a line are written, so reading the
+    sales orders risk of a partner doesn't need to aggregate its lines.
+    """
+
+    _name = "partner.risk.sale.total"
+    _description = "Partner Risk Sales Orders Total"
+    _log_access = False
+
+    partner_id = fields.Many2one(
+        comodel_name="res.partner",
+        required=True,
+        index=True,
+        ondelete="cascade",
+    )
+    company_id = fields.Many2one(
+        comodel_name="res.company",
+        required=True,
+        ondelete="cascade",
+    )
+    currency_id = fields.Many2one(related="company_id.currency_id")
+    amount = fields.Monetary()
+
+    _sql_constraints = [
+        (
+            "partner_company_uniq",
+            "unique(partner_id, company_id)",
+            "Only one total by partner and company.",
+        )
+    ]
+
+    @api.model
+    def _read_line_amounts(self, line_ids):
+        """Stored values of the given sales order lines
+
+        :return: list of tuples (partner_id, company_id, risk_amount)
+        """
+        if not line_ids:
+            return []
+        self.env.cr.execute(
+            """
+            SELECT risk_partner_id, company_id, risk_amount
+            FROM sale_order_line
+            WHERE id IN %s
+                AND risk_partner_id IS NOT NULL
+                AND company_id IS NOT NULL
+                AND risk_amount IS NOT NULL
+                AND risk_amount != 0
+            """,
+            (tuple(line_ids),),
+        )
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _apply_deltas(self, old_rows, new_rows):
+        """Replace the amounts of old_rows by the ones of new_rows in the
+        totals and notify the partners whose total changes.
+
+        :param old_rows: list of tuples (partner_id, company_id, amount)
+        :param new_rows: list of tuples (partner_id, company_id, amount)
+        """
+        deltas = {}
+        for partner_id, company_id, amount in old_rows:
+            key = (partner_id, company_id)
+            deltas[key] = deltas.get(key, 0.0) - amount
+        for partner_id, company_id, amount in new_rows:
+            key = (partner_id, company_id)
+            deltas[key] = deltas.get(key, 0.0) + amount
+        deltas = [key + (amount,) for key, amount in deltas.items() if amount]
+        if not deltas:
+            return
+        # Sorted to lock the rows always in the same order
+        deltas.sort()
+        self.env.cr.execute(
+            """
+            INSERT INTO partner_risk_sale_total AS total
+                (partner_id, company_id, amount)
+            VALUES {}
+            ON CONFLICT (partner_id, company_id)
+            DO UPDATE SET amount = total.amount + EXCLUDED.amount
+            """.format(
+                ", ".join(["%s"] * len(deltas))
+            ),
+            deltas,
+        )
+        self.invalidate_cache(["amount"])
+        self.env["partner.risk.ledger"]._notify_partners_modified(
+            {partner_id for partner_id, _company_id, _amount in deltas}
+        )
+
+    @api.model
+    def _rebuild(self):
+        """Recompute all the totals from the sales order lines. Consistency
+        fallback for the incremental updates.
+        """
+        self.env["sale.order.line"].flush(
+            ["risk_amount", "risk_partner_id", "company_id"]
+        )
+        self.env.cr.execute("DELETE FROM partner_risk_sale_total")
+        self.env.cr.execute(
+            """
+            INSERT INTO partner_risk_sale_total (partner_id, company_id, amount)
+            SELECT risk_partner_id, company_id, SUM(risk_amount)
+            FROM sale_order_line
+            WHERE risk_partner_id IS NOT NULL
+                AND company_id IS NOT NULL
+                AND risk_amount != 0
+            GROUP BY risk_partner_id, company_id
+            """
+        )
+        _logger.info("Partner risk sales orders totals rebuilt")
+        self.invalidate_cache(["partner_id", "company_id", "amount"])
+
+    @api.model
+    def _cron_rebuild(self):
+        self._rebuild()
@@ -0,0 +1,21 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import fields, models
+
+
+class ResCompany(models.Model):
+    _inherit = "res.company"
+
+    include_risk_sale_order_done = fields.Boolean(
+        string="Include locked sale orders into risk calculation",
+        help="The change of this field recomputes the risk amount of the "
+        "locked sales orders of the company in a background job.",
+    )
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "include_risk_sale_order_done" in vals:
+            self.env["sale.order"].clear_caches()
+            self.env["sale.order.line"].sudo()._reset_risk_amount_done(self)
+        return res
@@ -6,6 +6,5 @@ class ResConfigSettings(models.TransientModel):
     _inherit = "res.config.settings"
 
     include_risk_sale_order_done = fields.Boolean(
-        "Include locked sale orders into risk calculation",
-        config_parameter="sale_financial_risk.include_risk_sale_order_done",
+        related="company_id.include_risk_sale_order_done", readonly=False
     )
@@ -1,7 +1,10 @@
 # Copyright 2016-2020 Tecnativa - Carlos Dauden
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
-from odoo import api, fields, models
+from collections import defaultdict
+
+from odoo import _, api, fields, models
+from odoo.osv import expression
 
 
 class ResPartner(models.Model):
@@ -23,39 +26,132 @@ class ResPartner(models.Model):
     )
 
     def _get_risk_sale_order_domain(self):
-        risk_states = self.env["sale.order"]._get_risk_states()
-        return self._get_risk_company_domain() + [
-            ("state", "in", risk_states),
-            ("risk_partner_id", "in", self.mapped("commercial_partner_id").ids),
-        ]
+        # Companies grouped by the states included in their risk
+        companies_by_states = defaultdict(list)
+        for company in self.env.companies:
+            risk_states = self.env["sale.order"]._get_risk_states(company)
+            companies_by_states[tuple(risk_states)].append(company.id)
+        state_domain = expression.OR(
+            [
+                [("company_id", "in", company_ids), ("state", "in", risk_states)]
+                for risk_states, company_ids in companies_by_states.items()
+            ]
+        )
+        return (
+            self._get_risk_company_domain()
+            + state_domain
+            + [("risk_partner_id", "in", self.mapped("commercial_partner_id").ids)]
+        )
 
-    @api.depends(
-        "sale_order_ids.order_line.risk_amount",
-        "child_ids.sale_order_ids.order_line.risk_amount",
-    )
+    @api.depends_context("allowed_company_ids", "tz")
     def _compute_risk_sale_order(self):
+        """Read the running totals of the partners by company. Partners are
+        notified every time their totals change.
+        """
         self.update({"risk_sale_order": 0.0})
-        orders_group = self.env["sale.order.line"].read_group(
-            domain=self._get_risk_sale_order_domain(),
-            fields=["risk_partner_id", "company_id", "risk_amount"],
-            groupby=["risk_partner_id", "company_id"],
-            orderby="id",
-            lazy=False,
+        partners = self.filtered("id")
+        if not partners:
+            return
+        self.env["sale.order.line"].flush(
+            list(self.env["sale.order.line"]._risk_sale_total_fields())
         )
-        for group in orders_group:
-            partner = self.browse(group["risk_partner_id"][0])
-            company = self.env["res.company"].browse(
-                group["company_id"][0] or self.env.company.id
+        totals = (
+            self.env["partner.risk.sale.total"]
+            .sudo()
+            .search_read(
+                self._get_risk_company_domain() + [("partner_id", "in", partners.ids)],
+                ["partner_id", "company_id", "amount"],
             )
-            company_currency = company.currency_id
-            partner.risk_sale_order = company_currency._convert(
-                group["risk_amount"],
+        )
+        today = fields.Date.context_today(self)
+        for total in totals:
+            total["partner"] = self.browse(total["partner_id"][0])
+            total["company"] = self.env["res.company"].browse(total["company_id"][0])
+        self.env["res.currency"]._preload_risk_rates(
+            (
+                total["company"].currency_id,
+                total["partner"].risk_currency_id,
+                total["company"],
+                today,
+            )
+            for total in totals
+        )
+        for total in totals:
+            partner = total["partner"]
+            company = total["company"]
+            partner.risk_sale_order += company.currency_id._risk_convert(
+                total["amount"],
                 partner.risk_currency_id,
                 company,
-                fields.Date.context_today(self),
-                round=False,
+                today,
             )
 
+    def _get_sale_risk_exception_msg(self, risk_amount):
+        """Reason why a new sale of risk_amount, expressed in the partner risk
+        currency, can't be confirmed. Empty string if it can.
+        """
+        self.ensure_one()
+        state = self._read_risk_states()[self.id]
+        if state["risk_exception"]:
+            return _("Financial risk exceeded.\n")
+        return self._get_sale_risk_limit_msg(state, risk_amount)
+
+    @api.model
+    def _get_sale_risk_limit_msg(self, state, risk_amount):
+        """Reason why a new sale of risk_amount can't be confirmed apart from
+        an existing risk exception. Empty string if it can.
+
+        :param state: dict given by _read_risk_states
+        """
+        if state["risk_sale_order_limit"] and (
+            (state["risk_sale_order"] + risk_amount) > state["risk_sale_order_limit"]
+        ):
+            return _("This sale order exceeds the sales orders risk.\n")
+        if state["risk_sale_order_include"] and (
+            (state["risk_total"] + risk_amount) > state["credit_limit"]
+        ):
+            return _("This sale order exceeds the financial risk.\n")
+        return ""
+
+    @api.model
+    def _get_risk_simulation_types(self):
+        res = super()._get_risk_simulation_types()
+        res["sale_order"] = ("risk_sale_order", "_get_sale_risk_limit_msg")
+        return res
+
+    @api.model
+    def check_sale_risk_batch(self, checks):
+        """Check in one call if partners can take new sales orders, for
+        external channels (webshops, EDI...).
+
+        Verdicts are the same given when a sales order is confirmed and they
+        are served from the stored risk of the partners, reading all of them
+        at once. Every check is evaluated on its own.
+
+        :param checks: list of [partner_id, amount, currency_id]. An empty
+                       currency_id means the amount is in the partner risk
+                       currency.
+        :return: list of dicts with the keys partner_id, exception and
+                 exception_msg, in the same order as checks.
+        """
+        documents = [
+            {
+                "type": "sale_order",
+                "partner_id": partner_id,
+                "amount": amount,
+                "currency_id": currency_id,
+            }
+            for partner_id, amount, currency_id in checks
+        ]
+        return [
+            {
+                "partner_id": result["partner_id"],
+                "exception": result["exception"],
+                "exception_msg": result["exception_msg"],
+            }
+            for result in self.simulate_risk(documents, accumulate=False)
+        ]
+
     @api.onchange("risk_currency_id")
     def _onchange_risk_currency_id(self):
         super()._onchange_risk_currency_id()
@@ -1,68 +1,147 @@
 # Copyright 2016-2020 Tecnativa - Carlos Dauden
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
-from odoo import _, api, fields, models
-from odoo.tools import float_round
+import logging
+import threading
+from collections import defaultdict
+
+from odoo import api, fields, models, tools
+from odoo.tools import float_round, split_every
+
+_logger = logging.getLogger(__name__)
 
 
 class SaleOrder(models.Model):
     _inherit = "sale.order"
 
-    def evaluate_risk_message(self, partner):
+    def _get_partner_risk_amount(self, partner):
+        """Amount of the order in the risk currency of the partner"""
         self.ensure_one()
-        risk_amount = self.currency_id._convert(
+        return self.currency_id._risk_convert(
             self.amount_total,
             partner.risk_currency_id,
             self.company_id,
             self.date_order
             and self.date_order.date()
             or fields.Date.context_today(self),
-            round=False,
         )
-        exception_msg = ""
-        if partner.risk_exception:
-            exception_msg = _("Financial risk exceeded.\n")
-        elif partner.risk_sale_order_limit and (
-            (partner.risk_sale_order + risk_amount) > partner.risk_sale_order_limit
-        ):
-            exception_msg = _("This sale order exceeds the sales orders risk.\n")
-        elif partner.risk_sale_order_include and (
-            (partner.risk_total + risk_amount) > partner.credit_limit
-        ):
-            exception_msg = _("This sale order exceeds the financial risk.\n")
-        return exception_msg
+
+    def evaluate_risk_message(self, partner):
+        self.ensure_one()
+        return partner._get_sale_risk_exception_msg(
+            self._get_partner_risk_amount(partner)
+        )
+
+    def _get_risk_exception_orders(self):
+        """Evaluate all the orders to confirm at once, sorted by order date.
+
+        The risk of every partner is read once and the amounts of the
+        accepted orders are accumulated by partner, so the orders of the
+        same partner are checked against each other. Accepted orders reserve
+        their amount.
+
+        :return: list of tuples (order, exception message) of the blocked
+                 orders
+        """
+        if self.env.context.get("bypass_risk", False) or not self:
+            return []
+        orders = self.sorted(lambda x: (x.date_order, x.id))
+        partners = [order.partner_invoice_id.commercial_partner_id for order in orders]
+        amounts = [
+            order._get_partner_risk_amount(partner)
+            for order, partner in zip(orders, partners)
+        ]
+        # Orders being confirmed at the same time by other transactions are
+        # checked too, and the accepted orders reserve their amount
+        exception_msgs = self.env["partner.risk.reservation"]._simulate_and_reserve(
+            orders,
+            [
+                {
+                    "type": "sale_order",
+                    "partner_id": partner.id,
+                    "amount": amount,
+                    "currency_id": partner.risk_currency_id.id,
+                }
+                for partner, amount in zip(partners, amounts)
+            ],
+        )
+        return [
+            (order, exception_msg)
+            for order, exception_msg in zip(orders, exception_msgs)
+            if exception_msg
+        ]
+
+    def _confirm_risk_batch(self):
+        """Confirm the orders that don't exceed the partners risk, for large
+        batches where the blocked orders mustn't stop the other ones.
+
+        :return: list of tuples (order, exception message) of the blocked
+                 orders, that are left unconfirmed
+        """
+        blocked = self._get_risk_exception_orders()
+        blocked_orders = self.browse([order.id for order, _msg in blocked])
+        self.env["partner.risk.reservation"]._release(blocked_orders)
+        if self - blocked_orders:
+            (self - blocked_orders).with_context(bypass_risk=True).action_confirm()
+        return blocked
 
     def action_confirm(self):
-        if not self.env.context.get("bypass_risk", False):
-            for order in self:
-                partner = order.partner_invoice_id.commercial_partner_id
-                exception_msg = order.evaluate_risk_message(partner)
-                if exception_msg:
-                    return (
-                        self.env["partner.risk.exceeded.wiz"]
-                        .create(
-                            {
-                                "exception_msg": exception_msg,
-                                "partner_id": partner.id,
-                                "origin_reference": "%s,%s" % ("sale.order", order.id),
-                                "continue_method": "action_confirm",
-                            }
-                        )
-                        .action_show()
-                    )
-        return super().action_confirm()
+        blocked = self._get_risk_exception_orders()
+        if blocked:
+            self.env["partner.risk.reservation"]._release(self)
+            first_order, exception_msg = blocked[0]
+            if len(blocked) > 1:
+                exception_msg = "".join(
+                    "{}: {}".format(order.name, msg) for order, msg in blocked
+                )
+            return (
+                self.env["partner.risk.exceeded.wiz"]
+                .create(
+                    {
+                        "exception_msg": exception_msg,
+                        "partner_id": (
+                            first_order.partner_invoice_id.commercial_partner_id.id
+                        ),
+                        "origin_reference": "%s,%s" % ("sale.order", first_order.id),
+                        "origin_res_ids": ",".join(str(x) for x in self.ids),
+                        "continue_method": "action_confirm",
+                    }
+                )
+                .action_show()
+            )
+        res = super().action_confirm()
+        self.env["partner.risk.reservation"]._convert(self)
+        return res
+
+    def action_cancel(self):
+        self.env["partner.risk.reservation"]._release(self)
+        return super().action_cancel()
+
+    def _filter_risk_reservation_settled(self):
+        """Orders already included in the partner risk"""
+        return self.filtered(lambda x: x.state in self._get_risk_states(x.company_id))
+
+    @api.model
+    def _get_risk_states(self, company=None):
+        """States of the orders included in the risk of the company, the
+        current one by default.
+        """
+        company = company or self.env.company
+        return list(self._get_company_risk_states(company.id))
 
     @api.model
-    def _get_risk_states(self):
+    @tools.ormcache("company_id")
+    def _get_company_risk_states(self, company_id):
         risk_states = ["sale"]
-        ICP = self.env["ir.config_parameter"].sudo()
-        if ICP.get_param("sale_financial_risk.include_risk_sale_order_done"):
+        company = self.env["res.company"].sudo().browse(company_id)
+        if company.include_risk_sale_order_done:
             risk_states.append("done")
-        return risk_states
+        return tuple(risk_states)
 
 
 class SaleOrderLine(models.Model):
     _inherit = "sale.order.line"
+    _risk_amount_chunk_size = 5000
 
     company_currency_id = fields.Many2one(
         comodel_name="res.currency",
@@ -84,6 +163,106 @@ class SaleOrderLine(models.Model):
         index=True,
     )
 
+    @api.model
+    def _risk_sale_total_fields(self):
+        """Fields that change the partner risk sales orders totals"""
+        return {"risk_amount", "risk_partner_id", "company_id"}
+
+    @api.model
+    def _create(self, data_list):
+        lines = super()._create(data_list)
+        total_model = self.env["partner.risk.sale.total"].sudo()
+        total_model._apply_deltas([], total_model._read_line_amounts(lines.ids))
+        return lines
+
+    def _write(self, vals):
+        if self._risk_sale_total_fields().isdisjoint(vals):
+            return super()._write(vals)
+        total_model = self.env["partner.risk.sale.total"].sudo()
+        old_rows = total_model._read_line_amounts(self.ids)
+        res = super()._write(vals)
+        total_model._apply_deltas(old_rows, total_model._read_line_amounts(self.ids))
+        return res
+
+    def unlink(self):
+        total_model = self.env["partner.risk.sale.total"].sudo()
+        self.flush(self._risk_sale_total_fields())
+        total_model._apply_deltas(total_model._read_line_amounts(self.ids), [])
+        return super().unlink()
+
+    @api.model
+    def _reset_risk_amount_done(self, companies):
+        """Take the locked orders of the companies out of the risk totals and
+        leave their risk amount to be computed again by a background job.
+        """
+        self.flush(list(self._risk_sale_total_fields()) + ["state"])
+        self.env.cr.execute(
+            """
+            UPDATE partner_risk_sale_total total
+            SET amount = total.amount - line.amount
+            FROM (
+                SELECT risk_partner_id, company_id, SUM(risk_amount) AS amount
+                FROM sale_order_line
+                WHERE company_id IN %(company_ids)s
+                    AND state = 'done'
+                    AND risk_partner_id IS NOT NULL
+                    AND risk_amount != 0
+                GROUP BY risk_partner_id, company_id
+            ) line
+            WHERE total.partner_id = line.risk_partner_id
+                AND total.company_id = line.company_id
+            RETURNING total.partner_id
+            """,
+            {"company_ids": tuple(companies.ids)},
+        )
+        partner_ids = {row[0] for row in self.env.cr.fetchall()}
+        self.env.cr.execute(
+            """
+            UPDATE sale_order_line
+            SET risk_amount = NULL
+            WHERE company_id IN %s AND state = 'done'
+            """,
+            (tuple(companies.ids),),
+        )
+        self.invalidate_cache(["risk_amount"])
+        self.env["partner.risk.sale.total"].invalidate_cache(["amount"])
+        if partner_ids:
+            self.env["partner.risk.ledger"]._notify_partners_modified(partner_ids)
+        self.env.ref(
+            "sale_financial_risk.ir_cron_sale_risk_amount_compute"
+        ).sudo()._trigger()
+
+    @api.model
+    def _compute_missing_risk_amount(self, chunk_size=None, auto_commit=False):
+        """Compute by chunks the risk amount of the lines without it stored"""
+        chunk_size = chunk_size or self._risk_amount_chunk_size
+        self.env.cr.execute(
+            "SELECT id FROM sale_order_line WHERE risk_amount IS NULL ORDER BY id"
+        )
+        line_ids = [row[0] for row in self.env.cr.fetchall()]
+        field = self._fields["risk_amount"]
+        done_count = 0
+        for chunk in split_every(chunk_size, line_ids):
+            lines = self.browse(chunk)
+            self.env.add_to_compute(field, lines)
+            # Partners are notified by the update of their totals
+            lines.flush(["risk_amount"])
+            lines.invalidate_cache()
+            done_count += len(chunk)
+            _logger.info(
+                "Computing field risk_amount on sale.order.line: %s of %s lines",
+                done_count,
+                len(line_ids),
+            )
+            if auto_commit:
+                self.flush()
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+
+    @api.model
+    def _cron_compute_missing_risk_amount(self):
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
+        self._compute_missing_risk_amount(auto_commit=auto_commit)
+
     @api.depends(
         "state",
         "price_reduce_taxinc",
@@ -92,11 +271,19 @@ class SaleOrderLine(models.Model):
         "qty_invoiced",
     )
     def _compute_risk_amount(self):
-        risk_states = self.env["sale.order"]._get_risk_states()
-        for line in self:
-            if line.state not in risk_states or line.display_type:
-                line.risk_amount = 0.0
-                continue
+        order_model = self.env["sale.order"]
+        today = fields.Date.context_today(self)
+        lines = self.filtered(
+            lambda x: x.state in order_model._get_risk_states(x.company_id)
+            and not x.display_type
+        )
+        (self - lines).update({"risk_amount": 0.0})
+        # Added the check because fails in post-migration compute
+        check_moves = "move_ids" in self._fields
+        pending_line_ids = check_moves and lines._get_risk_pending_move_line_ids()
+        # Amounts in order currency grouped by conversion
+        groups = defaultdict(list)
+        for line in lines:
             qty = line.product_uom_qty
             if line.product_id.invoice_policy == "delivery":
                 qty = max(qty, line.qty_delivered)
@@ -104,16 +291,13 @@ class SaleOrderLine(models.Model):
                 qty - line.qty_invoiced, precision_rounding=line.product_uom.rounding
             )
             # There is no risk if the line hasn't stock moves to deliver
-            # Added hasattr condition because fails in post-migration compute
             if (
                 risk_qty
+                and check_moves
                 and line.qty_delivered_method == "stock_move"
-                and (hasattr(line, "move_ids"))
+                and line.id not in pending_line_ids
             ):
-                if not line.move_ids.filtered(
-                    lambda move: move.state not in ("done", "cancel")
-                ):
-                    risk_qty = line.qty_to_invoice
+                risk_qty = line.qty_to_invoice
             if risk_qty == 0.0:
                 line.risk_amount = 0.0
                 continue
@@ -122,12 +306,43 @@ class SaleOrderLine(models.Model):
                 risk_amount = line.price_total * (risk_qty / line.product_uom_qty)
             else:
                 risk_amount = line.price_reduce_taxinc * risk_qty
-            line.risk_amount = line.order_id.currency_id._convert(
-                risk_amount,
-                line.order_id.partner_id.risk_currency_id,
+            order = line.order_id
+            key = (
+                order.currency_id,
+                order.partner_id.risk_currency_id,
                 line.company_id,
-                line.order_id.date_order
-                and line.order_id.date_order.date()
-                or fields.Date.context_today(self),
-                round=False,
+                order.date_order and order.date_order.date() or today,
+            )
+            groups[key].append((line, risk_amount))
+        self.env["res.currency"]._preload_risk_rates(groups.keys())
+        for (currency, risk_currency, company, date), amounts in groups.items():
+            rate = currency._risk_convert(1.0, risk_currency, company, date)
+            for line, risk_amount in amounts:
+                line.risk_amount = risk_amount * rate
+
+    def _get_risk_pending_move_line_ids(self):
+        """Lines with stock moves pending to deliver, read with one query
+
+        :return: set of sale.order.line ids
+        """
+        lines = self.filtered(lambda x: x.qty_delivered_method == "stock_move")
+        # New records in onchange can't be searched
+        new_lines = lines.filtered(lambda x: not isinstance(x.id, int))
+        pending_line_ids = {
+            line.id
+            for line in new_lines
+            if line.move_ids.filtered(lambda x: x.state not in ("done", "cancel"))
+        }
+        lines -= new_lines
+        if lines:
+            moves_group = self.env["stock.move"].read_group(
+                [
+                    ("sale_line_id", "in", lines.ids),
+                    ("state", "not in", ("done", "cancel")),
+                ],
+                ["sale_line_id"],
+                ["sale_line_id"],
+                orderby="sale_line_id",
             )
+            pending_line_ids |= {group["sale_line_id"][0] for group in moves_group}
+        return pending_line_ids
@@ -1 +1,2 @@
 from . import test_partner_sale_risk
+from . import test_benchmark
@@ -0,0 +1,66 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo.tests import tagged
+
+from odoo.addons.account_financial_risk.tests.benchmark_common import (
+    RiskBenchmarkCase,
+)
+
+
+@tagged("-standard", "risk_benchmark")
+class TestSaleFinancialRiskBenchmark(RiskBenchmarkCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.product = cls.env["product.product"].create(
+            {"name": "Benchmark product", "type": "service", "invoice_policy": "order"}
+        )
+        partners = cls.benchmark_partners
+        cls.order_partners = partners - partners._filter_risk_exception()
+        orders = cls.env["sale.order"].create(
+            [
+                {
+                    "partner_id": partner.id,
+                    "order_line": [
+                        (
+                            0,
+                            0,
+                            {
+                                "product_id": cls.product.id,
+                                "product_uom_qty": 1.0 + index,
+                                "price_unit": 10.0,
+                            },
+                        )
+                        for index in range(cls.benchmark_line_count)
+                    ],
+                }
+                for partner in cls.order_partners
+                for _order in range(2)
+            ]
+        )
+        # Half of the orders are confirmed to have open sales order lines
+        cls.confirmed_orders = orders[::2]
+        cls.confirmed_orders.with_context(bypass_risk=True).action_confirm()
+        cls.orders = orders - cls.confirmed_orders
+
+    def test_benchmark_risk_sale_order(self):
+        lines = self.confirmed_orders.order_line
+        lines.invalidate_cache()
+        with self.benchmark("sale.order.line._compute_risk_amount", len(lines)):
+            lines._compute_risk_amount()
+        partners = self.order_partners
+        partners.invalidate_cache()
+        with self.benchmark("res.partner._compute_risk_sale_order", len(partners)):
+            partners._compute_risk_sale_order()
+        self.assertTrue(all(partners.mapped("risk_sale_order")))
+
+    def test_benchmark_sale_confirm(self):
+        checks = [
+            [order.partner_id.id, order.amount_total, False] for order in self.orders
+        ]
+        with self.benchmark("res.partner.check_sale_risk_batch", len(checks)):
+            self.env["res.partner"].check_sale_risk_batch(checks)
+        with self.benchmark("sale.order.action_confirm", len(self.orders)):
+            self.orders.action_confirm()
+        self.assertEqual(set(self.orders.mapped("state")), {"sale"})
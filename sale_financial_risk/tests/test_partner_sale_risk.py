@@ -4,6 +4,11 @@
 from odoo import fields
 from odoo.tests.common import SavepointCase
 
+from odoo.addons.sale_financial_risk.hooks import (
+    compute_missing_risk_amount,
+    create_risk_amount_column,
+)
+
 
 class TestPartnerSaleRisk(SavepointCase):
     @classmethod
@@ -85,12 +90,7 @@ class TestPartnerSaleRisk(SavepointCase):
         self.env["ir.config_parameter"].create(
             {"key": "sale.auto_done_setting", "value": "True"}
         )
-        self.env["ir.config_parameter"].create(
-            {
-                "key": "sale_financial_risk.include_risk_sale_order_done",
-                "value": "True",
-            }
-        )
+        self.env.company.include_risk_sale_order_done = True
         self.sale_order.action_confirm()
         self.assertAlmostEqual(self.partner.risk_sale_order, 100.0)
         self.assertFalse(self.partner.risk_exception)
@@ -163,6 +163,178 @@ class TestPartnerSaleRisk(SavepointCase):
         self.assertAlmostEqual(line.risk_amount, 0.0)
         self.assertAlmostEqual(self.partner.risk_sale_order, 0.0)
 
+    def test_compute_risk_amount_batch(self):
+        sale_order2 = self.sale_order.copy()
+        sale_order2.order_line.product_uom_qty = 2.0
+        orders = self.sale_order | sale_order2
+        orders.action_confirm()
+        self.assertEqual(orders.order_line.mapped("risk_amount"), [100.0, 200.0])
+        self.assertAlmostEqual(self.partner.risk_sale_order, 300.0)
+        # Lines of services have no stock moves
+        self.assertFalse(orders.order_line._get_risk_pending_move_line_ids())
+
+    def test_risk_amount_hooks(self):
+        invoiced_order = self.sale_order.copy()
+        product_delivery = self.product.copy({"invoice_policy": "delivery"})
+        self.sale_order.write(
+            {
+                "order_line": [
+                    (
+                        0,
+                        0,
+                        {
+                            "name": product_delivery.name,
+                            "product_id": product_delivery.id,
+                            "product_uom_qty": 2,
+                            "product_uom": product_delivery.uom_id.id,
+                            "price_unit": 50.0,
+                        },
+                    ),
+                    (0, 0, {"name": "Section", "display_type": "line_section"}),
+                ]
+            }
+        )
+        draft_order = self.sale_order.copy()
+        (self.sale_order | invoiced_order).action_confirm()
+        invoiced_order._create_invoices()
+        lines = (self.sale_order | invoiced_order | draft_order).order_line
+        lines.flush()
+        expected = {line.id: line.risk_amount for line in lines}
+        self.assertEqual(len([x for x in expected.values() if x]), 2)
+        self.env.cr.execute(
+            "UPDATE sale_order_line SET risk_amount = NULL WHERE id IN %s",
+            (tuple(lines.ids),),
+        )
+        lines.invalidate_cache(["risk_amount"])
+        # SQL only fills lines with zero risk for the ORM
+        create_risk_amount_column(self.env.cr)
+        self.env.cr.execute(
+            "SELECT id, risk_amount FROM sale_order_line WHERE id IN %s",
+            (tuple(lines.ids),),
+        )
+        for line_id, risk_amount in self.env.cr.fetchall():
+            if risk_amount is not None:
+                self.assertEqual(expected[line_id], 0.0)
+        compute_missing_risk_amount(self.env)
+        lines.invalidate_cache(["risk_amount"])
+        for line in lines:
+            self.assertAlmostEqual(line.risk_amount, expected[line.id])
+        # Lines filled by the helpers are added to the totals from scratch
+        self.env["partner.risk.sale.total"]._rebuild()
+        self.assertAlmostEqual(self.partner.risk_sale_order, 200.0)
+
+    def test_risk_sale_total(self):
+        total_model = self.env["partner.risk.sale.total"]
+        self.sale_order.action_confirm()
+        sale_order2 = self.sale_order.copy()
+        sale_order2.action_confirm()
+        total_model.flush()
+        total = total_model.search([("partner_id", "=", self.partner.id)])
+        self.assertEqual(total.company_id, self.env.company)
+        self.assertAlmostEqual(total.amount, 200.0)
+        self.assertAlmostEqual(self.partner.risk_sale_order, 200.0)
+        sale_order2.action_cancel()
+        self.assertAlmostEqual(self.partner.risk_sale_order, 100.0)
+        self.assertAlmostEqual(total.amount, 100.0)
+        # Orders of a contact are added to its commercial partner
+        contact = self.env["res.partner"].create(
+            {"name": "Contact", "parent_id": self.partner.id}
+        )
+        sale_order3 = self.sale_order.copy({"partner_id": contact.id})
+        sale_order3.action_confirm()
+        self.assertAlmostEqual(self.partner.risk_sale_order, 200.0)
+        sale_order3.order_line.product_uom_qty = 3.0
+        self.assertAlmostEqual(self.partner.risk_sale_order, 400.0)
+        self.assertAlmostEqual(total.amount, 400.0)
+        total_model._rebuild()
+        total = total_model.search([("partner_id", "=", self.partner.id)])
+        self.assertAlmostEqual(total.amount, 400.0)
+
+    def test_risk_sale_total_invoice_partner(self):
+        invoice_partner = self.env["res.partner"].create(
+            {
+                "name": "Invoice partner test",
+                "customer_rank": 1,
+                "risk_sale_order_include": True,
+                "credit_limit": 50.0,
+            }
+        )
+        self.sale_order.partner_invoice_id = invoice_partner
+        self.sale_order.with_context(bypass_risk=True).action_confirm()
+        partners = self.partner | invoice_partner
+        # The stored risk of the partner invoiced is updated with its totals
+        partners.flush()
+        partners.invalidate_cache()
+        self.assertAlmostEqual(invoice_partner.risk_total, 100.0)
+        self.assertAlmostEqual(invoice_partner.risk_amount_exceeded, 50.0)
+        self.assertTrue(invoice_partner.risk_exception)
+        self.assertAlmostEqual(self.partner.risk_sale_order, 0.0)
+        self.partner.write({"risk_sale_order_include": True, "credit_limit": 50.0})
+        self.sale_order.partner_invoice_id = self.partner
+        partners.flush()
+        partners.invalidate_cache()
+        self.assertAlmostEqual(invoice_partner.risk_total, 0.0)
+        self.assertFalse(invoice_partner.risk_exception)
+        self.assertAlmostEqual(self.partner.risk_total, 100.0)
+        self.assertTrue(self.partner.risk_exception)
+
+    def test_confirm_risk_batch(self):
+        self.partner.risk_sale_order_limit = 250.0
+        orders = self.sale_order
+        for _i in range(3):
+            orders |= self.sale_order.copy()
+        # Orders of the same partner are accumulated and all the blocked ones
+        # are reported
+        wiz_dic = orders.action_confirm()
+        wiz = self.env[wiz_dic["res_model"]].browse(wiz_dic["res_id"])
+        self.assertEqual(
+            wiz.exception_msg,
+            "{0}: This sale order exceeds the sales orders risk.\n"
+            "{1}: This sale order exceeds the sales orders risk.\n".format(
+                orders[2].name, orders[3].name
+            ),
+        )
+        self.assertEqual(set(orders.mapped("state")), {"draft"})
+        blocked = orders._confirm_risk_batch()
+        self.assertEqual([x[0] for x in blocked], [orders[2], orders[3]])
+        self.assertEqual(orders.mapped("state"), ["sale", "sale", "draft", "draft"])
+        self.assertAlmostEqual(self.partner.risk_sale_order, 200.0)
+        # The batch is reserved at once and blocked orders are released
+        reservations = self.env["partner.risk.reservation"].search(
+            [("res_model", "=", "sale.order"), ("res_id", "in", orders.ids)]
+        )
+        self.assertEqual(reservations.mapped("res_id"), orders[:2].ids)
+        self.assertEqual(set(reservations.mapped("state")), {"converted"})
+        wiz_dic = orders[2:].action_confirm()
+        wiz = self.env[wiz_dic["res_model"]].browse(wiz_dic["res_id"])
+        wiz.button_continue()
+        self.assertEqual(set(orders.mapped("state")), {"sale"})
+
+    def test_include_risk_sale_order_done(self):
+        order_model = self.env["sale.order"]
+        self.assertEqual(order_model._get_risk_states(), ["sale"])
+        self.sale_order.action_confirm()
+        self.sale_order.action_done()
+        self.assertAlmostEqual(self.partner.risk_sale_order, 0.0)
+        self.env.company.include_risk_sale_order_done = True
+        self.assertEqual(order_model._get_risk_states(), ["sale", "done"])
+        self.assertEqual(order_model._get_risk_states(self.other_company), ["sale"])
+        # Locked orders are computed by a background job
+        line = self.sale_order.order_line
+        self.env.cr.execute(
+            "SELECT risk_amount FROM sale_order_line WHERE id = %s", (line.id,)
+        )
+        self.assertIsNone(self.env.cr.fetchone()[0])
+        self.env["sale.order.line"]._cron_compute_missing_risk_amount()
+        self.assertAlmostEqual(line.risk_amount, 100.0)
+        self.assertAlmostEqual(self.partner.risk_sale_order, 100.0)
+        # Locked orders are taken out of the totals right away
+        self.env.company.include_risk_sale_order_done = False
+        self.assertAlmostEqual(self.partner.risk_sale_order, 0.0)
+        self.env["sale.order.line"]._cron_compute_missing_risk_amount()
+        self.assertAlmostEqual(line.risk_amount, 0.0)
+        self.assertAlmostEqual(self.partner.risk_sale_order, 0.0)
+
     def test_open_risk_pivot_info(self):
         action = self.partner.with_context(
             open_risk_field="risk_sale_order"
@@ -222,3 +394,99 @@ class TestPartnerSaleRisk(SavepointCase):
         # Limit exceeded
         self.assertNotEquals(result, True)
         self.assertEqual(result["res_model"], "partner.risk.exceeded.wiz")
+
+    def test_check_sale_risk_batch(self):
+        self.sale_order.action_confirm()
+        partner2 = self.env["res.partner"].create(
+            {"name": "Partner test 2", "customer_rank": 1, "credit_limit": 10.0}
+        )
+        contact = self.env["res.partner"].create(
+            {"name": "Contact", "parent_id": self.partner.id}
+        )
+        self.partner.risk_sale_order_limit = 150.0
+        res = self.env["res.partner"].check_sale_risk_batch(
+            [
+                [self.partner.id, 40.0, False],
+                [contact.id, 60.0, self.main_currency.id],
+                [partner2.id, 20.0, False],
+            ]
+        )
+        self.assertEqual(
+            [x["partner_id"] for x in res], [self.partner.id, contact.id, partner2.id]
+        )
+        self.assertFalse(res[0]["exception"])
+        self.assertEqual(res[0]["exception_msg"], "")
+        self.assertTrue(res[1]["exception"])
+        self.assertEqual(
+            res[1]["exception_msg"], "This sale order exceeds the sales orders risk.\n"
+        )
+        # Without included risks there is no credit limit check
+        self.assertFalse(res[2]["exception"])
+        partner2.risk_sale_order_include = True
+        res = self.env["res.partner"].check_sale_risk_batch([[partner2.id, 20.0, 0]])
+        self.assertEqual(
+            res[0]["exception_msg"], "This sale order exceeds the financial risk.\n"
+        )
+        self.partner.risk_sale_order_limit = 99.0
+        res = self.env["res.partner"].check_sale_risk_batch(
+            [[self.partner.id, 1.0, False]]
+        )
+        self.assertEqual(res[0]["exception_msg"], "Financial risk exceeded.\n")
+        self.assertEqual(self.env["res.partner"].check_sale_risk_batch([]), [])
+        # Checks of the same partner aren't accumulated
+        self.partner.risk_sale_order_limit = 150.0
+        res = self.env["res.partner"].check_sale_risk_batch(
+            [[self.partner.id, 40.0, False], [contact.id, 40.0, False]]
+        )
+        self.assertEqual([x["exception"] for x in res], [False, False])
+
+    def test_simulate_risk(self):
+        self.sale_order.action_confirm()
+        self.partner.write(
+            {
+                "risk_sale_order_limit": 150.0,
+                "risk_sale_order_include": True,
+                "credit_limit": 200.0,
+            }
+        )
+        contact = self.env["res.partner"].create(
+            {"name": "Contact", "parent_id": self.partner.id}
+        )
+        res = self.env["res.partner"].simulate_risk(
+            [
+                {"type": "sale_order", "partner_id": self.partner.id, "amount": 30.0},
+                {"type": "sale_order", "partner_id": contact.id, "amount": 30.0},
+                {"type": "sale_order", "partner_id": contact.id, "amount": 20.0},
+            ]
+        )
+        self.assertEqual([x["exception"] for x in res], [False, True, False])
+        self.assertEqual(
+            res[1]["exception_msg"], "This sale order exceeds the sales orders risk.\n"
+        )
+        self.assertEqual([x["headroom"] for x in res], [70.0, 70.0, 50.0])
+        self.assertEqual(res[2]["partner_id"], contact.id)
+        self.assertAlmostEqual(self.partner.risk_sale_order, 100.0)
+
+    def test_risk_reservation(self):
+        self.partner.risk_sale_order_limit = 150.0
+        sale_order2 = self.sale_order.copy()
+        # Order being confirmed by another user
+        self.assertEqual(sale_order2._get_risk_exception_orders(), [])
+        wiz_dic = self.sale_order.action_confirm()
+        wiz = self.env[wiz_dic["res_model"]].browse(wiz_dic["res_id"])
+        self.assertEqual(
+            wiz.exception_msg, "This sale order exceeds the sales orders risk.\n"
+        )
+        sale_order2.action_cancel()
+        self.sale_order.action_confirm()
+        self.assertEqual(self.sale_order.state, "sale")
+        reservations = self.env["partner.risk.reservation"].search(
+            [("partner_id", "=", self.partner.id)]
+        )
+        self.assertEqual(reservations.mapped("res_id"), [self.sale_order.id])
+        self.assertEqual(reservations.state, "converted")
+        # The confirmed order isn't counted twice
+        self.partner.risk_sale_order_limit = 250.0
+        sale_order3 = self.sale_order.copy()
+        sale_order3.action_confirm()
+        self.assertEqual(sale_order3.state, "sale")
@@ -4,11 +4,12 @@
 {
     "name": "Partner Stock Risk",
     "summary": "Manage partner risk in stock moves",
-    "version": "14.0.1.0.1",
+    "version": "14.0.1.2.0",
     "category": "Sales Management",
     "license": "AGPL-3",
     "author": "Tecnativa, " "Odoo Community Association (OCA)",
     "website": "https://github.com/OCA/credit-control",
     "depends": ["stock", "account_financial_risk"],
+    "data": ["views/stock_picking_views.xml"],
     "installable": True,
 }
@@ -1 +1,2 @@
+from . import procurement_group
 from . import stock
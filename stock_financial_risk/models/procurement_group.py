@@ -0,0 +1,62 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+import logging
+
+from odoo import api, models
+
+_logger = logging.getLogger(__name__)
+
+
+class ProcurementGroup(models.Model):
+    _inherit = "procurement.group"
+    _risk_held_log_sample = 10
+
+    @api.model
+    def _run_scheduler_tasks(self, use_new_cursor=False, company_id=False):
+        if self.env.context.get("bypass_risk"):
+            return super()._run_scheduler_tasks(
+                use_new_cursor=use_new_cursor, company_id=company_id
+            )
+        held_partner_ids = self._hold_risk_exception_pickings(company_id)
+        return super(
+            ProcurementGroup,
+            self.with_context(risk_held_partner_ids=held_partner_ids),
+        )._run_scheduler_tasks(use_new_cursor=use_new_cursor, company_id=company_id)
+
+    @api.model
+    def _hold_risk_exception_pickings(self, company_id=False):
+        """Flag the deliveries waiting for availability whose partner has the
+        financial risk exceeded. Risk verdicts are read once for all the
+        partners of the run, and the availability of their moves isn't
+        checked by the scheduler.
+
+        :return: ids of the commercial partners with risk exceeded
+        """
+        moves = (
+            self.env["stock.move"]
+            .sudo()
+            .search(
+                self._get_moves_to_assign_domain(company_id)
+                + [("location_dest_id.usage", "=", "customer")]
+            )
+        )
+        risk_partners = (
+            moves.picking_id.partner_id | moves.partner_id
+        )._filter_risk_exception()
+        # Same moves skipped by _action_assign
+        held_moves = moves._filter_risk_held(set(risk_partners.ids))
+        held = held_moves.picking_id
+        moves.picking_id._update_risk_held(held)
+        if held:
+            names = held[: self._risk_held_log_sample].mapped("name")
+            if len(held) > len(names):
+                names.append("...")
+            _logger.info(
+                "Scheduler held %s deliveries of %s partners with financial "
+                "risk exceeded: %s",
+                len(held),
+                len(held_moves.mapped(lambda x: x._get_risk_partner())),
+                ", ".join(names),
+            )
+        return risk_partners.ids
@@ -1,7 +1,7 @@
 # Copyright 2016 Carlos Dauden <carlos.dauden@tecnativa.com>
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
-from odoo import _, exceptions, models
+from odoo import _, exceptions, fields, models
 
 
 class StockMove(models.Model):
@@ -9,11 +9,10 @@ class StockMove(models.Model):
 
     def _action_done(self, cancel_backorder=False):
         if not self.env.context.get("bypass_risk"):
-            moves = self.filtered(
-                lambda x: (
-                    x.location_dest_id.usage == "customer"
-                    and x.partner_id.commercial_partner_id.risk_exception
-                )
+            moves = self.filtered(lambda x: x.location_dest_id.usage == "customer")
+            risk_partners = moves.partner_id._filter_risk_exception()
+            moves = moves.filtered(
+                lambda x: x.partner_id.commercial_partner_id in risk_partners
             )
             if moves:
                 raise exceptions.UserError(
@@ -24,10 +23,40 @@ class StockMove(models.Model):
                 )
         return super()._action_done(cancel_backorder=cancel_backorder)
 
+    def _action_assign(self):
+        held_partner_ids = self.env.context.get("risk_held_partner_ids")
+        moves = self
+        if held_partner_ids and not self.env.context.get("bypass_risk"):
+            moves -= self._filter_risk_held(set(held_partner_ids))
+        return super(StockMove, moves)._action_assign()
+
+    def _get_risk_partner(self):
+        """Commercial partner whose risk holds the move, the one of the
+        transfer or the one of the move if the transfer has none.
+        """
+        self.ensure_one()
+        return (self.picking_id.partner_id or self.partner_id).commercial_partner_id
+
+    def _filter_risk_held(self, partner_ids):
+        """Outgoing moves to customers of the given commercial partners"""
+        return self.filtered(
+            lambda x: x.location_dest_id.usage == "customer"
+            and x._get_risk_partner().id in partner_ids
+        )
+
 
 class StockPicking(models.Model):
     _inherit = "stock.picking"
 
+    risk_held = fields.Boolean(
+        string="Held by Financial Risk",
+        readonly=True,
+        copy=False,
+        help="The availability of the transfer hasn't been checked by the "
+        "scheduler or a mass check because the financial risk of the partner "
+        "is exceeded.",
+    )
+
     def show_risk_wizard(self, continue_method):
         return (
             self.env["partner.risk.exceeded.wiz"]
@@ -46,23 +75,75 @@ class StockPicking(models.Model):
         if not self.env.context.get("bypass_risk"):
             if (
                 self.location_dest_id.usage == "customer"
-                and self.partner_id.commercial_partner_id.risk_exception
+                and self.partner_id._filter_risk_exception()
             ):
                 return self.show_risk_wizard("action_confirm")
         return super(StockPicking, self).action_confirm()
 
+    def _split_risk_held(self, risk_partners=None):
+        """Split self into the transfers with outgoing moves held by the
+        financial risk of their partner and the other ones, the same moves
+        skipped by the scheduler. Risk verdicts are read once for all the
+        partners of the batch.
+
+        :return: tuple (held pickings, other pickings)
+        """
+        moves = self.move_lines
+        if risk_partners is None:
+            risk_partners = (
+                self.partner_id | moves.partner_id
+            )._filter_risk_exception()
+        held = moves._filter_risk_held(set(risk_partners.ids)).picking_id & self
+        return held, self - held
+
+    def _update_risk_held(self, held):
+        """Flag the held transfers of self and unflag the other ones"""
+        held.filtered(lambda x: not x.risk_held).write({"risk_held": True})
+        (self - held).filtered("risk_held").write({"risk_held": False})
+
+    def show_risk_held_wizard(self, continue_method):
+        """Summary of all the held transfers, that can be forced at once"""
+        exception_msg = _(
+            "Financial risk exceeded in %s transfers:\n%s",
+            len(self),
+            "\n".join(
+                "{}: {}".format(picking.name, picking.partner_id.display_name)
+                for picking in self
+            ),
+        )
+        return (
+            self.env["partner.risk.exceeded.wiz"]
+            .create(
+                {
+                    "exception_msg": exception_msg,
+                    "partner_id": self[:1].partner_id.commercial_partner_id.id,
+                    "origin_reference": "{},{}".format(self._name, self[:1].id),
+                    "origin_res_ids": ",".join(str(x) for x in self.ids),
+                    "continue_method": continue_method,
+                }
+            )
+            .action_show()
+        )
+
     def action_assign(self):
-        if not self.env.context.get("bypass_risk") and self.filtered(
-            "partner_id.commercial_partner_id.risk_exception"
-        ):
+        if self.env.context.get("bypass_risk"):
+            self._update_risk_held(self.browse())
+            return super(StockPicking, self).action_assign()
+        held, pickings = self._split_risk_held()
+        self._update_risk_held(held)
+        if not held:
+            return super(StockPicking, self).action_assign()
+        if len(self) == 1:
             return self.show_risk_wizard("action_assign")
-        return super(StockPicking, self).action_assign()
+        if pickings:
+            super(StockPicking, pickings).action_assign()
+        return held.show_risk_held_wizard("action_assign")
 
     def button_validate(self):
         if not self.env.context.get("bypass_risk"):
             if (
                 self.location_dest_id.usage == "customer"
-                and self.partner_id.commercial_partner_id.risk_exception
+                and self.partner_id._filter_risk_exception()
             ):
                 return self.show_risk_wizard("button_validate")
         return super(StockPicking, self).button_validate()
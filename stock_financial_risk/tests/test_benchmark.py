@@ -0,0 +1,64 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo.tests import tagged
+
+from odoo.addons.account_financial_risk.tests.benchmark_common import (
+    RiskBenchmarkCase,
+)
+
+
+@tagged("-standard", "risk_benchmark")
+class TestStockFinancialRiskBenchmark(RiskBenchmarkCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.product = cls.env["product.product"].create(
+            {"name": "Benchmark product", "type": "consu"}
+        )
+        partners = cls.benchmark_partners
+        cls.picking_partners = partners - partners._filter_risk_exception()
+        picking_type = cls.env.ref("stock.picking_type_out")
+        cls.pickings = cls.env["stock.picking"].create(
+            [
+                {
+                    "picking_type_id": picking_type.id,
+                    "location_id": picking_type.default_location_src_id.id,
+                    "location_dest_id": cls.env.ref(
+                        "stock.stock_location_customers"
+                    ).id,
+                    "partner_id": partner.id,
+                    "move_lines": [
+                        (
+                            0,
+                            0,
+                            {
+                                "name": cls.product.name,
+                                "product_id": cls.product.id,
+                                "product_uom_qty": 1.0,
+                                "product_uom": cls.product.uom_id.id,
+                                "location_id": (
+                                    picking_type.default_location_src_id.id
+                                ),
+                                "location_dest_id": cls.env.ref(
+                                    "stock.stock_location_customers"
+                                ).id,
+                            },
+                        )
+                    ],
+                }
+                for partner in cls.picking_partners
+            ]
+        )
+
+    def test_benchmark_picking_validate(self):
+        pickings = self.pickings
+        with self.benchmark("stock.picking.action_confirm", len(pickings)):
+            pickings.action_confirm()
+        with self.benchmark("stock.picking.action_assign", len(pickings)):
+            pickings.action_assign()
+        for move in pickings.move_lines:
+            move.quantity_done = move.product_uom_qty
+        with self.benchmark("stock.picking.button_validate", len(pickings)):
+            pickings.button_validate()
+        self.assertEqual(set(pickings.mapped("state")), {"done"})
@@ -97,3 +97,65 @@ class TestStockFinancialRisk(common.SavepointCase):
         self.partner.risk_exception = True
         res = self.picking.button_validate()
         self.assertEqual(res["name"], "Partner risk exceeded")
+
+    def _create_picking(self, partner, location_dest=None):
+        location_dest = location_dest or self.location_customers
+        picking = self.picking.copy(
+            {
+                "partner_id": partner.id,
+                "location_dest_id": location_dest.id,
+                "move_lines": [],
+            }
+        )
+        self.move.copy({"picking_id": picking.id, "location_dest_id": location_dest.id})
+        return picking
+
+    def test_action_assign_risk_held_batch(self):
+        partner2 = self.partner.copy({"name": "Partner test 2"})
+        picking2 = self._create_picking(partner2)
+        # Only the deliveries to customers are held
+        internal_picking = self._create_picking(
+            self.partner,
+            self.env["stock.location"].create(
+                {"name": "Test location 2", "usage": "internal"}
+            ),
+        )
+        pickings = self.picking | picking2 | internal_picking
+        pickings.with_context(bypass_risk=True).action_confirm()
+        self.partner.risk_exception = True
+        res = pickings.action_assign()
+        wizard = self.env["partner.risk.exceeded.wiz"].browse(res["res_id"])
+        self.assertIn(self.picking.name, wizard.exception_msg)
+        self.assertNotIn(picking2.name, wizard.exception_msg)
+        self.assertNotIn(internal_picking.name, wizard.exception_msg)
+        self.assertFalse(internal_picking.risk_held)
+        self.assertEqual(internal_picking.state, "assigned")
+        self.assertTrue(self.picking.risk_held)
+        self.assertEqual(self.picking.state, "confirmed")
+        self.assertFalse(picking2.risk_held)
+        self.assertEqual(picking2.state, "assigned")
+        wizard.button_continue()
+        self.assertFalse(self.picking.risk_held)
+        self.assertEqual(self.picking.state, "assigned")
+
+    def test_scheduler_risk_held(self):
+        partner2 = self.partner.copy({"name": "Partner test 2"})
+        picking2 = self._create_picking(partner2)
+        # Transfer without partner holding the moves of the partner
+        picking3 = self._create_picking(self.partner)
+        picking3.partner_id = False
+        picking3.move_lines.partner_id = self.partner
+        pickings = self.picking | picking2 | picking3
+        pickings.with_context(bypass_risk=True).action_confirm()
+        self.partner.risk_exception = True
+        self.env["procurement.group"].run_scheduler()
+        self.assertTrue(self.picking.risk_held)
+        self.assertEqual(self.picking.state, "confirmed")
+        self.assertTrue(picking3.risk_held)
+        self.assertEqual(picking3.state, "confirmed")
+        self.assertFalse(picking2.risk_held)
+        self.assertEqual(picking2.state, "assigned")
+        self.partner.risk_exception = False
+        self.env["procurement.group"].run_scheduler()
+        self.assertFalse(self.picking.risk_held)
+        self.assertEqual(self.picking.state, "assigned")